@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# Compare the size and JSON decode time of a full search page against
+# one projected to the appdata categories plus the app key, as
+# requested through outfields by TFTacyt.maxSearch.
+#
+# Usage: python benchmarks/outfields_bench.py [pages]
+
+from __future__ import print_function
+from __future__ import division
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import payloads
+from tftutils import TFTUtils
+
+
+def main(pages=20):
+    categories = TFTUtils.getCategoriesFromFile(payloads.APPDATAFILE)
+    fields = categories + ['key']
+    results = payloads.makeResults(100)
+    projected = {'result': {'numresults': 100, 'applications': [
+        dict((k, v) for k, v in app.items() if k in fields)
+        for app in results['result']['applications']]}}
+
+    full = json.dumps({'data': results})
+    small = json.dumps({'data': projected})
+    fullTime = min(timeit.repeat(lambda: json.loads(full), number=pages, repeat=3)) / pages
+    smallTime = min(timeit.repeat(lambda: json.loads(small), number=pages, repeat=3)) / pages
+
+    print("Fields per app:  %d full, %d projected" % (len(results['result']['applications'][0]), len(fields)))
+    print("Bytes per page:  %d full, %d projected (%.1fx smaller)" %
+          (len(full), len(small), len(full) / len(small)))
+    print("Decode per page: %.2f ms full, %.3f ms projected (%.1fx faster)" %
+          (fullTime * 1000, smallTime * 1000, fullTime / smallTime))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,80 @@
+# Synthetic Tacyt search payloads for the benchmarks.
+#
+# Apps carry every field listed in the appdata file, with sizes close
+# to real Tacyt documents: a long androidXMLManifest, hundreds of file
+# paths, a description, permission and image lists, and so on.
+
+from __future__ import print_function
+from __future__ import division
+import os
+import random
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+APPDATAFILE = os.path.join(ROOT, 'appdata')
+
+LIST_FIELDS = {
+    'filePaths': 400,
+    'apkFiles': 60,
+    'links': 30,
+    'marketLinks': 3,
+    'apkImages': 8,
+    'permissionName': 25,
+    'emails': 3,
+}
+LONG_TEXT_FIELDS = {
+    'androidXMLManifest': 20000,
+    'description': 2500,
+    'recentChanges': 400,
+    'certificatePublicKey': 600,
+    'certficatePublicKeyInfo': 600,
+}
+WORDS = ('android app game free play social photo video music battery '
+         'cleaner booster security fast share friends chat camera').split()
+
+
+# Every field name listed in the appdata file, commented out or not
+def allFields(fileName=APPDATAFILE):
+    fields = []
+    with open(fileName) as f:
+        for line in f:
+            name = line.strip().lstrip('#').strip()
+            if name and ' ' not in name and ',' not in name:
+                fields.append(name)
+    return fields
+
+
+def text(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size = size + len(word) + 1
+    return ' '.join(words)
+
+
+def makeApp(rng, fields, i):
+    app = {}
+    for name in fields:
+        if name in LIST_FIELDS:
+            app[name] = ['%s/%s_%d' % (name, rng.choice(WORDS), j)
+                         for j in range(LIST_FIELDS[name])]
+        elif name in LONG_TEXT_FIELDS:
+            app[name] = text(rng, LONG_TEXT_FIELDS[name])
+        elif name.startswith('n') or name.endswith('Cont') or name in (
+                'size', 'numDownloads', 'price', 'versionCode',
+                'certificateValidityGapSeconds', 'minSdkVersion', 'targetSdkVersion'):
+            app[name] = rng.randint(0, 10 ** rng.randint(1, 8))
+        else:
+            app[name] = text(rng, 24)
+    app['key'] = 'com.example.app%dGooglePlay' % i
+    return app
+
+
+# A search results payload of n apps, as returned in Response.get_data()
+def makeResults(n=100, seed=0, fields=None):
+    rng = random.Random(seed)
+    if fields is None:
+        fields = allFields()
+    apps = [makeApp(rng, fields, i) for i in range(n)]
+    return {'result': {'numresults': n, 'applications': apps}}
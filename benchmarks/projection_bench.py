@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# Compare formatting a search page the old way, popping every key of
+# each app that isn't a category and then filling in the missing ones,
+# against the compiled single-pass tftschema.Projection used by
+# TFTacyt.getFormattedApplicationsFromResults.
+#
+# Usage: python benchmarks/projection_bench.py [pages]
+
+from __future__ import print_function
+from __future__ import division
+import copy
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import payloads
+from tftschema import Projection
+from tftutils import TFTUtils
+
+
+# The previous getFormattedApplication, mutating the app in place
+def popFormat(app, categories, notFound):
+    for key in list(app.keys()):
+        if key not in categories:
+            app.pop(key, None)
+    appKeys = app.keys()
+    for cat in categories:
+        if cat not in appKeys:
+            app[cat] = notFound
+    return app
+
+
+def main(pages=20):
+    categories = TFTUtils.getCategoriesFromFile(payloads.APPDATAFILE) + ['key']
+    results = payloads.makeResults(100)
+    apps = results['result']['applications']
+    # The old way consumes its input, so it gets a fresh copy of the page
+    # every run, made outside the timing
+    copies = [copy.deepcopy(apps) for i in range(pages * 3)]
+
+    def pop():
+        page = copies.pop()
+        return [popFormat(app, categories, -1) for app in page]
+
+    def project():
+        return Projection(categories, -1).projectAll(apps)
+
+    assert pop() == project()
+    popTime = min(timeit.repeat(pop, number=pages, repeat=2)) / pages
+    projectTime = min(timeit.repeat(project, number=pages, repeat=3)) / pages
+
+    print("Fields per app:  %d full, %d projected" % (len(apps[0]), len(categories)))
+    print("Format per page: %.3f ms popping, %.3f ms projecting (%.1fx faster)" %
+          (popTime * 1000, projectTime * 1000, popTime / projectTime))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
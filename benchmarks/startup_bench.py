@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# Measure the import time of the TensorFlow-Tacyt modules in a fresh
+# interpreter and check that none of them pulls in tflearn or
+# TensorFlow. Dataset building and scoring must start without them,
+# only TFTacyt.createModel loads them.
+#
+# Exits with status 1 if a heavy module is imported or the median
+# import time of a module exceeds the limit.
+#
+# Usage: python benchmarks/startup_bench.py [runs] [max ms]
+
+from __future__ import print_function
+from __future__ import division
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+MODULES = ['tftutils', 'tft', 'tftscore', 'tftinference']
+HEAVY = ['tflearn', 'tensorflow']
+
+# Imports the module, then prints its import time and the heavy
+# modules left in sys.modules on the last line
+PROBE = """
+import sys, time
+start = time.time()
+import %s
+elapsed = time.time() - start
+sys.stdout.write('\\n%%f %%s\\n' %% (elapsed, ','.join(m for m in %r if m in sys.modules)))
+"""
+
+
+def probe(module):
+    output = subprocess.check_output([sys.executable, '-c', PROBE % (module, HEAVY)],
+                                     cwd=ROOT, universal_newlines=True)
+    elapsed, heavy = (output.splitlines()[-1] + ' ').split(' ', 1)
+    return float(elapsed), [m for m in heavy.strip().split(',') if m]
+
+
+def main(runs=5, maxMs=1000):
+    failed = False
+    for module in MODULES:
+        times = []
+        heavy = []
+        for i in range(runs):
+            elapsed, loaded = probe(module)
+            times.append(elapsed * 1000)
+            heavy = loaded
+        median = sorted(times)[len(times) // 2]
+        status = 'ok'
+        if heavy:
+            status = 'FAIL: imports ' + ', '.join(heavy)
+            failed = True
+        elif median > maxMs:
+            status = 'FAIL: over %d ms' % maxMs
+            failed = True
+        print("import %-13s %8.1f ms  %s" % (module, median, status))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(*[int(arg) for arg in sys.argv[1:]]))
@@ -1,19 +1,26 @@
 #!/usr/bin/env python
 
+from __future__ import print_function
 from tft import TFTacyt
 from tftutils import TFTUtils
+from tacyt.ResponseCache import ResponseCache
 
 APPDATAFILE = 'appdata'
 
 # Create the API, define categories to use, create TFTacyt instance
 api = TFTUtils.readAPI('keys.api')
+# Keep search responses on disk so rebuilding the dataset reuses them
+api.set_cache(ResponseCache('cache'))
 categories = TFTUtils.getCategoriesFromFile(APPDATAFILE)
-TFT = TFTacyt(api, categories, verbosity=TFTUtils.SILENT)
+TFT = TFTacyt(api, categories, verbosity=TFTUtils.SILENT, maxInFlight=16)
 
 api = TFT.api
 categories = TFT.categories
 RESET = False
 TRAIN = False
+# Continue an interrupted training run from its checkpoint. Only a
+# checkpoint of the same dataset is resumed.
+RESUME = False
 if RESET:
     # Get results for malicious apps and add them to the TFT dataset
     with open("maliciousapps/XavierApps.txt") as f:
@@ -21,37 +28,41 @@ if RESET:
     with open("maliciousapps/JudyApps.txt") as f:
         content.extend(f.readlines())
     content = [x.rstrip('\r\n') for x in content]
-    TFT.addDatasetFromTerms(content, malicious=True)
+    TFT.addDatasetFromTerms(content, malicious=True, workers=8, pageWorkers=2)
     # Get known good apps and add them to the TFT dataset
     goodTerms = ["developerName:\"Google Inc.\"",
                  "developerName:\"Gameloft\"",
                  "developerName:\"Facebook\""]
-    TFT.addDatasetFromTerms(goodTerms, malicious=False)
-    # Pickle it to use later because searching takes forever.
+    TFT.addDatasetFromTerms(goodTerms, malicious=False, workers=8, pageWorkers=2)
+    # Save it to use later because searching takes forever.
     TFT.saveDataset()
 else:
     TFT.loadDataset()
 # Preprocess data (randomize and normalize)
 TFT.preprocess()
-# Remove random testing set
-testSet, testSetLabels = TFT.createTestingSet()
-# Print for debug.
-TFT.vPrint(TFT.DATA)
-TFT.vPrint(type(TFT.DATA))
-for i in TFT.DATA:
-    TFT.vPrint(str(len(i)) + ' : ' + str(i))
-TFT.vPrint(TFT.LABELS)
-TFT.vPrint(type(TFT.LABELS))
-TFT.vPrint(TFT.LABELS.shape)
-TFT.vPrint(TFT.LABELS.dtype)
+# Remove a random testing set. The fixed seed holds out the same apps
+# every run, so a checkpoint trained on the rest can be resumed.
+testSet, testSetLabels = TFT.createTestingSet(stratify=True, seed=1)
+# Print for debug. The rows are only read and formatted when debug
+# messages are output.
+if TFT.Util.isEnabled(TFTUtils.DEBUG):
+    TFT.vPrint("%s %s", TFTUtils.DEBUG, type(TFT.DATA), TFT.DATA.shape)
+    for i in TFT.DATA:
+        TFT.vPrint("%d : %s", TFTUtils.DEBUG, len(i), i)
+    TFT.vPrint("%s", TFTUtils.DEBUG, TFT.LABELS)
+    TFT.vPrint("%s %s %s", TFTUtils.DEBUG, type(TFT.LABELS), TFT.LABELS.shape, TFT.LABELS.dtype)
 # Build neural network
 TFT.createModel()
 if TRAIN:
-    # Start training.
-    TFT.trainModel()
+    # Start training, stopping once the validation loss stops improving.
+    # Checkpoints let an interrupted run resume where it left off.
+    TFT.trainModel(validationSplit=0.1, patience=20,
+                   checkpointPath='models/checkpoint.tflearn', resume=RESUME)
     # Save the model
     TFT.saveModel()
 else:
     TFT.loadModel()
 # Test the models predictions
-TFT.validateModel(testSet, testSetLabels)
+result = TFT.validateModel(testSet, testSetLabels)
+print(result.summary())
+print("Threshold for at most 1% false positives:", result.thresholdFor(0.01))
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+This library offers an API to use Tacyt in a python environment.
+Copyright (C) 2015 Eleven Paths
+'''
+
+import functools
+import logging
+import ssl
+
+import trollius as asyncio
+from trollius import From, Return
+
+from PageIterator import PageCursor, PageIterator
+from ResponseCache import ResponseCache
+from TacytApp import TacytApp
+from Version import Version
+from authorization.Auth import Auth
+from authorization.RequestScheduler import RequestScheduler
+
+
+class AsyncPageIterator(PageCursor):
+    '''
+    Coroutine based iteration over the pages of a paged API listing, the asynchronous
+    counterpart of PageIterator. Each call to next_page resolves to the items of the next
+    page, the following page being fetched in the background meanwhile, e.g.:
+
+        pages = api.iter_search_apps("developerName:\"Gameloft\"")
+        while True:
+            apps = yield From(pages.next_page())
+            if apps is None:
+                break
+
+    Paging stops like PageIterator, see PageCursor; next_page then resolves to None.
+    fetch_page returns a coroutine resolving to the Response of a page number.
+    '''
+
+    def __init__(self, fetch_page, extract_items, page_size=None, first_page=1, max_pages=None,
+                 prefetch=True, loop=None):
+        '''
+        See PageCursor for the parameters.
+        @param $loop The event loop to fetch the pages on
+        '''
+        super(AsyncPageIterator, self).__init__(fetch_page, extract_items, page_size, first_page,
+                                                max_pages, prefetch)
+        self.loop = loop
+        self._page = first_page
+        self._pending = None
+        self._done = False
+
+    def _start(self, page):
+        if self.prefetch:
+            return asyncio.ensure_future(self.fetch_page(page), loop=self.loop)
+        return page
+
+    @asyncio.coroutine
+    def _result(self, pending):
+        if self.prefetch:
+            response = yield From(pending)
+        else:
+            response = yield From(self.fetch_page(pending))
+        raise Return(response)
+
+    @asyncio.coroutine
+    def next_page(self):
+        '''
+        @return coroutine resolving to the list of items of the next page, None once the listing is exhausted or a page failed
+        '''
+        if self._done:
+            raise Return(None)
+        if self._pending is None:
+            self._pending = self._start(self._page)
+        response = yield From(self._result(self._pending))
+        self._pending = None
+        result = self._page_items(self._page, response)
+        if result is None:
+            self._done = True
+            raise Return(None)
+        items, last = result
+        if last:
+            self._done = True
+        else:
+            self._page += 1
+            if self.prefetch:
+                self._pending = self._start(self._page)
+        raise Return(items)
+
+    @asyncio.coroutine
+    def all_items(self):
+        '''
+        @return coroutine resolving to the list of the items of every remaining page
+        '''
+        items = []
+        while True:
+            page = yield From(self.next_page())
+            if page is None:
+                raise Return(items)
+            items.extend(page)
+
+
+class AsyncTacytApp(TacytApp):
+    '''
+    Asyncio variant of TacytApp built on non-blocking sockets.
+    It has the same methods as TacytApp, but each of them returns a coroutine that resolves
+    to the same Response object the blocking client returns, e.g.:
+
+        response = yield From(api.search_apps("title:\"5G Speed For Android\""))
+
+    The iter_* methods return an AsyncPageIterator, whose pages are awaited one at a time.
+    '''
+
+    def __init__(self, app_id, secret_key, cache=None, key_pool=None, loop=None):
+        '''
+        Create an instance of the class with the Application ID and secret obtained from Tacyt
+        @param $app_id
+        @param $secret_key
+        @param $cache Optional ResponseCache for search and details requests
+        @param $key_pool Optional KeyPool spreading the requests across several API keys
+        @param $loop The event loop to run the requests on. Defaults to the current event loop.
+        '''
+        super(AsyncTacytApp, self).__init__(app_id, secret_key, cache, key_pool)
+        self.loop = loop
+
+    def get_loop(self):
+        if self.loop is None:
+            return asyncio.get_event_loop()
+        return self.loop
+
+    @asyncio.coroutine
+    def _cached(self, endpoint, body, fetch):
+        '''
+        Coroutine version of TacytApp._cached, fetch returns a coroutine.
+        '''
+        if self.cache is None:
+            response = yield From(fetch())
+            raise Return(response)
+
+        key = ResponseCache.get_key(endpoint, body)
+        response = self.cache.get(key)
+        if response is not None:
+            raise Return(response)
+        if self.cache.offline:
+            raise Return(self.cache.offline_response())
+
+        response = yield From(fetch())
+        self.cache.set(key, response)
+        raise Return(response)
+
+    @asyncio.coroutine
+    def _http(self, method, url, x_headers=None, body=None, file=None, content_type=None, retry=True):
+        '''
+        Non-blocking HTTP Request to the specified API endpoint.
+        Requests are signed with a key from the key pool, if any, and paced and retried by the
+        RequestScheduler of that key without blocking the loop.
+        @param method string
+        @param x_headers list
+        @param body dict json
+        @param retry False for requests that change data on the server, see RequestScheduler.call
+        @return coroutine resolving to a TacytResponse, with an error if the request failed
+        '''
+
+        signer = self.get_signer()
+        if signer is None:
+            raise Return(Auth.error_response(RequestScheduler.CIRCUIT_OPEN_ERROR_CODE,
+                                             RequestScheduler.CIRCUIT_OPEN_ERROR_MESSAGE))
+        scheduler = signer.get_request_scheduler()
+        attempt = 0
+        while True:
+            if not scheduler.breaker.allow():
+                raise Return(Auth.error_response(RequestScheduler.CIRCUIT_OPEN_ERROR_CODE,
+                                                 RequestScheduler.CIRCUIT_OPEN_ERROR_MESSAGE))
+            delay = scheduler.reserve()
+            if delay > 0:
+                yield From(asyncio.sleep(delay, loop=self.get_loop()))
+
+            request_url, json_body, auth_headers = signer.prepare_request(method, url, x_headers, body, file, content_type)
+            try:
+                status, response_data = yield From(self._request(method, request_url, json_body, auth_headers))
+            except RequestScheduler.TRANSIENT_ERRORS as e:
+                scheduler.breaker.record_failure()
+                if not retry or attempt >= scheduler.max_retries:
+                    logging.error("Request to " + url + " failed: " + repr(e))
+                    raise Return(Auth.error_response("-1", repr(e)))
+            except Exception as e:
+                scheduler.breaker.record_failure()
+                logging.error("Request to " + url + " failed: " + repr(e))
+                raise Return(Auth.error_response("-1", repr(e)))
+            else:
+                if not scheduler.is_retryable_status(status, retry):
+                    scheduler.breaker.record_success()
+                    raise Return(Auth.build_response(status, response_data))
+                scheduler.breaker.record_failure()
+                if attempt >= scheduler.max_retries:
+                    raise Return(Auth.build_response(status, response_data))
+
+            yield From(asyncio.sleep(scheduler.backoff(attempt), loop=self.get_loop()))
+            attempt += 1
+
+    @asyncio.coroutine
+    def _request(self, method, url, body=None, headers=None):
+        '''
+        Send a single request on a new connection and read the whole response.
+        @return a tuple (status, response body as bytes)
+        '''
+        if Auth.API_PROXY is not None:
+            if Auth.API_HTTPS:
+                raise IOError("HTTPS proxies are not supported by the asynchronous client")
+            host, port = Auth.API_PROXY, Auth.API_PROXY_PORT
+        else:
+            host, port = Version.API_HOST, Auth.API_PORT
+
+        ssl_context = None
+        if Auth.API_HTTPS:
+            ssl_context = ssl.create_default_context()
+
+        reader, writer = yield From(asyncio.open_connection(host, port, ssl=ssl_context,
+                                                            loop=self.get_loop()))
+        try:
+            writer.write(AsyncTacytApp.build_request(method, url, body, headers))
+            status, response_headers = yield From(AsyncTacytApp.read_head(reader))
+            data = yield From(AsyncTacytApp.read_body(reader, response_headers))
+        finally:
+            writer.close()
+
+        raise Return((status, data))
+
+    @staticmethod
+    def build_request(method, url, body=None, headers=None):
+        '''
+        @return the raw HTTP/1.1 request as bytes
+        '''
+        host = Version.API_HOST
+        if Auth.API_PORT not in (80, 443):
+            host = "%s:%d" % (host, Auth.API_PORT)
+
+        lines = ["%s %s HTTP/1.1" % (method, url),
+                 "Host: %s" % host,
+                 "Connection: close"]
+        if headers:
+            for key, value in headers.items():
+                if value is not None:
+                    lines.append("%s: %s" % (key, value))
+        if body is None:
+            body = ""
+        elif isinstance(body, unicode):
+            body = body.encode('utf8')
+        lines.append("%s: %d" % (Auth.HTTP_HEADER_CONTENT_LENGTH, len(body)))
+
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('utf8') + body
+
+    @staticmethod
+    @asyncio.coroutine
+    def read_head(reader):
+        '''
+        @return a tuple (status, dict of lower cased response headers)
+        '''
+        status_line = yield From(reader.readline())
+        if not status_line:
+            raise IOError("Connection closed before the response status was received")
+        status = int(status_line.split(None, 2)[1])
+
+        headers = dict()
+        while True:
+            line = yield From(reader.readline())
+            line = line.strip()
+            if not line:
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        raise Return((status, headers))
+
+    @staticmethod
+    @asyncio.coroutine
+    def read_body(reader, headers):
+        '''
+        Read a response body delimited by chunked encoding, Content-Length or the end of the stream.
+        '''
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size_line = yield From(reader.readline())
+                size = int(size_line.split(";")[0].strip(), 16)
+                if size == 0:
+                    # Skip the trailer
+                    while (yield From(reader.readline())).strip():
+                        pass
+                    break
+                chunk = yield From(reader.readexactly(size))
+                chunks.append(chunk)
+                yield From(reader.readexactly(2))
+            raise Return(b"".join(chunks))
+
+        if Auth.HTTP_HEADER_CONTENT_LENGTH.lower() in headers:
+            data = yield From(reader.readexactly(int(headers[Auth.HTTP_HEADER_CONTENT_LENGTH.lower()])))
+            raise Return(data)
+
+        data = yield From(reader.read())
+        raise Return(data)
+
+    def iter_search_apps(self, query, maxResults=100, outfields=None, grouped=None, prefetch=True,
+                         max_pages=TacytApp.ITER_MAX_PAGES):
+        '''
+        Iterate over the pages of apps matching the query, fetching the next page in the background.
+        @return AsyncPageIterator resolving to the application dicts of each page
+        '''
+        return AsyncPageIterator(lambda page: self.search_apps(query, page, maxResults, outfields, grouped),
+                                 PageIterator.search_items, page_size=maxResults, max_pages=max_pages,
+                                 prefetch=prefetch, loop=self.get_loop())
+
+    def iter_detected_apps(self, filter_id, prefetch=True, max_pages=TacytApp.ITER_MAX_PAGES):
+        '''
+        Iterate over the pages of applications detected by a filter, fetching the next page in the background.
+        @return AsyncPageIterator resolving to the detected applications of each page
+        '''
+        return AsyncPageIterator(lambda page: self.list_detected_apps(page, filter_id),
+                                 PageIterator.detection_items, max_pages=max_pages, prefetch=prefetch,
+                                 loop=self.get_loop())
+
+    def iter_group_detected_apps(self, groupName, prefetch=True, max_pages=TacytApp.ITER_MAX_PAGES):
+        '''
+        Iterate over the pages of applications detected by a filters group, fetching the next page in the background.
+        @return AsyncPageIterator resolving to the detected applications of each page
+        '''
+        return AsyncPageIterator(lambda page: self.list_group_detected_apps(page, groupName),
+                                 PageIterator.detection_items, max_pages=max_pages, prefetch=prefetch,
+                                 loop=self.get_loop())
+
+    def http_post_file(self, url, headers, file_stream, file_name, tag_name):
+        '''
+        Uploads go through the requests library, so they run on the default executor.
+        @return future resolving to a TacytResponse
+        '''
+        upload = functools.partial(TacytApp.http_post_file, self, url, headers, file_stream, file_name, tag_name)
+        return self.get_loop().run_in_executor(None, upload)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+This library offers an API to use Tacyt in a python environment.
+Copyright (C) 2015 Eleven Paths
+'''
+
+import threading
+
+from ExternalApiFilterRequest import ExternalApiFilterRequest
+
+
+class PageFetch(object):
+    '''
+    Fetches one page in a background thread.
+    '''
+
+    def __init__(self, fetch_page, page):
+        self._fetch_page = fetch_page
+        self._page = page
+        self._response = None
+        self._exception = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._response = self._fetch_page(self._page)
+        except Exception, e:
+            self._exception = e
+
+    def result(self):
+        self._thread.join()
+        if self._exception is not None:
+            raise self._exception
+        return self._response
+
+
+class PageCursor(object):
+    '''
+    Paging state shared by PageIterator and AsyncPageIterator: which page comes next, when the
+    listing ends, and the error of a failed page.
+    Paging stops at the first empty or short page, after max_pages pages, or at the first failed
+    page, whose error is kept in the error attribute.
+    '''
+
+    def __init__(self, fetch_page, extract_items, page_size=None, first_page=1, max_pages=None, prefetch=True):
+        '''
+        @param $fetch_page Function returning the Response of a page number
+        @param $extract_items Function returning the list of items in the data of a Response
+        @param $page_size Items in a full page. A shorter page ends the iteration. None to stop only on empty pages.
+        @param $first_page Number of the first page to fetch
+        @param $max_pages Maximum number of pages to fetch, None for no limit
+        @param $prefetch Fetch the next page while the current one is consumed
+        '''
+        self.fetch_page = fetch_page
+        self.extract_items = extract_items
+        self.page_size = page_size
+        self.first_page = first_page
+        self.max_pages = max_pages
+        self.prefetch = prefetch
+        self.error = None
+        self.pages = 0
+
+    def _is_last(self, page, items):
+        if not items:
+            return True
+        if self.page_size is not None and len(items) < self.page_size:
+            return True
+        return self.max_pages is not None and page - self.first_page + 1 >= self.max_pages
+
+    def _page_items(self, page, response):
+        '''
+        @return a tuple (items of the page, whether it is the last one), or None if the page failed
+        '''
+        if response is None or response.get_error():
+            self.error = response.get_error() if response is not None else None
+            return None
+        self.pages += 1
+        items = self.extract_items(response.get_data())
+        return items, self._is_last(page, items)
+
+
+class PageIterator(PageCursor):
+    '''
+    Lazily iterates over the items of a paged API listing.
+    The next page is fetched in the background while the items of the current one are consumed.
+    See PageCursor for when iteration stops.
+    '''
+
+    def _start(self, page):
+        if self.prefetch:
+            return PageFetch(self.fetch_page, page)
+        return page
+
+    def _result(self, pending):
+        if self.prefetch:
+            return pending.result()
+        return self.fetch_page(pending)
+
+    def __iter__(self):
+        page = self.first_page
+        pending = self._start(page)
+        while True:
+            result = self._page_items(page, self._result(pending))
+            if result is None:
+                return
+            items, last = result
+            if not last:
+                pending = self._start(page + 1)
+            for item in items:
+                yield item
+            if last:
+                return
+            page += 1
+
+    @staticmethod
+    def search_items(data):
+        '''
+        @return the applications in the data of a search response
+        '''
+        return data['result']['applications']
+
+    @staticmethod
+    def detection_items(data):
+        '''
+        @return the applications in the data of a detections listing response
+        '''
+        result = data.get('result', data)
+        for field in ('applications', ExternalApiFilterRequest.JSON_FIELD_DETECTIONS):
+            if result.get(field):
+                return result[field]
+        return []
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+This library offers an API to use Tacyt in a python environment.
+Copyright (C) 2015 Eleven Paths
+'''
+
+import errno
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from authorization.Auth import Response
+
+
+class ResponseCache(object):
+    '''
+    Content-addressed on-disk cache of API responses.
+    Entries are keyed by the endpoint and the canonical JSON body of the request, expire after
+    a TTL and are evicted least recently used first once the cache grows over its size cap.
+    Only responses without errors are stored.
+    '''
+
+    DEFAULT_TTL = 7 * 24 * 60 * 60
+    DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+    # Eviction frees space down to this share of the size cap, so the directory is only
+    # scanned again after many more writes
+    EVICT_TO = 0.9
+    FILE_EXTENSION = ".json"
+    OFFLINE_ERROR_CODE = "-2"
+    OFFLINE_ERROR_MESSAGE = "The response is not cached and the cache is in offline mode."
+
+    def __init__(self, directory, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE, offline=False):
+        '''
+        @param $directory Folder where the responses are stored. It is created if it doesn't exist.
+        @param $ttl Seconds a response is served from the cache. None to never expire.
+        @param $max_size Maximum size in bytes of the stored responses.
+        @param $offline If True, never reach the API and answer cache misses with an error response.
+        '''
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._size = sum(size for path, size, mtime in self._entries())
+
+    @staticmethod
+    def get_key(endpoint, body=None):
+        '''
+        @param $endpoint The API url of the request
+        @param $body The request body as a dict, None for GET requests
+        @return the hex digest identifying the request
+        '''
+        canonical = json.dumps(body, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256((endpoint + "\n" + canonical).encode('utf8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self.FILE_EXTENSION)
+
+    def _entries(self):
+        '''
+        @return a list of (path, size, last access time) for every stored response
+        '''
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.FILE_EXTENSION):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get(self, key):
+        '''
+        @return the cached Response for the key, or None if missing or expired
+        '''
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(f.read().decode('utf8'))
+        except (IOError, OSError, ValueError):
+            return None
+
+        if self.ttl is not None and time.time() - entry["created"] > self.ttl:
+            self._remove(path)
+            return None
+
+        # The modification time tracks the last access for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return Response(data=entry["data"], error="")
+
+    def set(self, key, response):
+        '''
+        Store a response. Missing responses and responses with errors are ignored.
+        '''
+        if response is None or response.get_error():
+            return
+        content = json.dumps({"created": time.time(), "data": response.get_data()}).encode('utf8')
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        path = self._path(key)
+        with self._lock:
+            previous = self._stat_size(path)
+            os.rename(tmp_path, path)
+            self._size += len(content) - previous
+            if self.max_size is not None and self._size > self.max_size:
+                self._evict()
+
+    def offline_response(self):
+        '''
+        @return the error response served for cache misses in offline mode
+        '''
+        return Response(json_string=json.dumps({"error": {"code": self.OFFLINE_ERROR_CODE,
+                                                          "message": self.OFFLINE_ERROR_MESSAGE}}))
+
+    def clear(self):
+        '''
+        Remove every stored response.
+        '''
+        with self._lock:
+            for path, size, mtime in self._entries():
+                self._remove(path)
+            self._size = 0
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under EVICT_TO of its size cap
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for path, size, mtime in entries)
+        target = self.max_size * self.EVICT_TO
+        for path, size, mtime in entries:
+            if self._size <= target:
+                break
+            self._remove(path)
+            self._size -= size
+
+    @staticmethod
+    def _stat_size(path):
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
@@ -7,6 +7,8 @@ from Filter import Filter
 from ExternalApiCompareRequest import ExternalApiCompareRequest
 from ExternalApiSearchRequest import ExternalApiSearchRequest
 from Version import Version
+from PageIterator import PageIterator
+from ResponseCache import ResponseCache
 from authorization.Auth import Auth
 
 import hashlib
@@ -30,13 +32,46 @@ class TacytApp(Auth):
     API_COMPARER_URL = "/api/"+Version.API_VERSION+"/compare"
     API_UPLOAD_URL = "/api/" +Version.API_VERSION+ "/upload"
 
-    def __init__(self, app_id, secret_key):
+    # Default page cap of the iter_* methods, so a listing that keeps returning full pages ends
+    ITER_MAX_PAGES = 1000
+
+    def __init__(self, app_id, secret_key, cache=None, key_pool=None):
         '''
         Create an instance of the class with the Application ID and secret obtained from Tacyt
         @param $app_id
         @param $secret_key
+        @param $cache Optional ResponseCache for search and details requests
+        @param $key_pool Optional KeyPool spreading the requests across several API keys
+        '''
+        super(TacytApp, self).__init__(app_id, secret_key, key_pool)
+        self.cache = cache
+
+    def set_cache(self, cache):
+        '''
+        @param $cache ResponseCache used for search and details requests, None to disable caching
         '''
-        super(TacytApp, self).__init__(app_id, secret_key)
+        self.cache = cache
+
+    def _cached(self, endpoint, body, fetch):
+        '''
+        Serve a request from the response cache if possible, otherwise call fetch and store its response.
+        @param $endpoint The API url of the request
+        @param $body The request body, None for GET requests
+        @param $fetch Function sending the request to the API
+        '''
+        if self.cache is None:
+            return fetch()
+
+        key = ResponseCache.get_key(endpoint, body)
+        response = self.cache.get(key)
+        if response is not None:
+            return response
+        if self.cache.offline:
+            return self.cache.offline_response()
+
+        response = fetch()
+        self.cache.set(key, response)
+        return response
 
 
     def search_apps(self, query, numberPage=None, maxResults=None, outfields = None, grouped=None):
@@ -47,14 +82,31 @@ class TacytApp(Auth):
         @return Json structure with the keys to the Applications found.
         '''
         result = ExternalApiSearchRequest(query, numberPage, maxResults, outfields, grouped)
-        return self.http_post(self.API_SEARCH_URL, None, body=result.get_json_encode_for_search())
+        body = result.get_json_encode_for_search()
+        return self._cached(self.API_SEARCH_URL, body,
+                            lambda: self.http_post(self.API_SEARCH_URL, None, body=body))
+
+    def iter_search_apps(self, query, maxResults=100, outfields=None, grouped=None, prefetch=True,
+                         max_pages=ITER_MAX_PAGES):
+        '''
+        Iterate lazily over every app matching the query, fetching the next page in the background.
+        @param $query The query string will filter the search results.
+        @param $maxResults A number between 1 and 100 indicating the apps retrieved per page.
+        @param $prefetch Fetch the next page while the current one is consumed.
+        @param $max_pages Maximum number of pages fetched, None for no limit.
+        @return PageIterator yielding the application dicts. Its error attribute is set if a page failed.
+        '''
+        return PageIterator(lambda page: self.search_apps(query, page, maxResults, outfields, grouped),
+                            PageIterator.search_items, page_size=maxResults, max_pages=max_pages,
+                            prefetch=prefetch)
 
     def get_app_details(self, key):
         '''
         @param $key The key of an application.
         @return Json structure with the details of an application.
         '''
-        return self.http_get(self.API_DETAILS_URL + "/" + key, None)
+        url = self.API_DETAILS_URL + "/" + key
+        return self._cached(url, None, lambda: self.http_get(url, None))
 
     def list_tags(self):
         '''
@@ -71,7 +123,7 @@ class TacytApp(Auth):
         @return A list of applications associates with a tag.
         '''
         result = ExternalApiTagRequest(ExternalApiTagRequest.CREATE_REQUEST, tag, app_keys)
-        return self.http_post(self.API_TAGS_URL, None, body=result.get_json_encode_dict_for_tag_based_requests())
+        return self.http_post(self.API_TAGS_URL, None, body=result.get_json_encode_dict_for_tag_based_requests(), retry=False)
 
     def remove_tag_for_apps(self, tag, app_keys):
         '''
@@ -80,7 +132,7 @@ class TacytApp(Auth):
         @param $app_keys Key applications that want to remove with the tag
         '''
         result = ExternalApiTagRequest(ExternalApiTagRequest.REMOVE_REQUEST, tag, app_keys)
-        return self.http_post(self.API_TAGS_URL, None, body=result.get_json_encode_dict_for_tag_based_requests())
+        return self.http_post(self.API_TAGS_URL, None, body=result.get_json_encode_dict_for_tag_based_requests(), retry=False)
 
     def delete_tag(self, tag):
         '''
@@ -88,7 +140,7 @@ class TacytApp(Auth):
         @param $tag the name of the tag you want to delete.
         '''
         result = ExternalApiTagRequest(ExternalApiTagRequest.REMOVE_ALL_REQUEST, tag, None)
-        return self.http_post(self.API_TAGS_URL, None, body=result.get_json_encode_dict_for_tag_based_requests())
+        return self.http_post(self.API_TAGS_URL, None, body=result.get_json_encode_dict_for_tag_based_requests(), retry=False)
 
     def create_filter(self, filter):
         '''
@@ -96,7 +148,7 @@ class TacytApp(Auth):
         @param $filter Filter structure.
         '''
         result = ExternalApiFilterRequest(ExternalApiFilterRequest.CREATE_REQUEST, filter, 0, None)
-        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_for_filter_based_requests())
+        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_for_filter_based_requests(), retry=False)
 
     def update_filter(self, filter):
         '''
@@ -104,7 +156,7 @@ class TacytApp(Auth):
         @param $filter Filter structure.
         '''
         result = ExternalApiFilterRequest(ExternalApiFilterRequest.UPDATE_REQUEST, filter, 0, None)
-        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_for_filter_based_requests())
+        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_for_filter_based_requests(), retry=False)
 
     def read_group_filters(self):
         '''
@@ -136,7 +188,7 @@ class TacytApp(Auth):
         '''
         filter = Filter(filter_id)
         result = ExternalApiFilterRequest(ExternalApiFilterRequest.DELETE_REQUEST, filter, 0, None)
-        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_for_filter_based_requests())
+        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_for_filter_based_requests(), retry=False)
 
     def search_public_filter(self, query, page):
         '''
@@ -164,13 +216,33 @@ class TacytApp(Auth):
         result = ExternalApiFilterRequest(ExternalApiFilterRequest.LIST_GROUP_DETECTIONS, None, page, groupName)
         return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_dict_filter_for_content_based_requests())
 
+    def iter_detected_apps(self, filter_id, prefetch=True, max_pages=ITER_MAX_PAGES):
+        '''
+        Iterate lazily over every application detected by a filter, fetching the next page in the background.
+        @param $filter_id id to the filter.
+        @param $max_pages Maximum number of pages fetched, None for no limit.
+        @return PageIterator yielding the detected applications. Its error attribute is set if a page failed.
+        '''
+        return PageIterator(lambda page: self.list_detected_apps(page, filter_id),
+                            PageIterator.detection_items, max_pages=max_pages, prefetch=prefetch)
+
+    def iter_group_detected_apps(self, groupName, prefetch=True, max_pages=ITER_MAX_PAGES):
+        '''
+        Iterate lazily over every application detected by a filters group, fetching the next page in the background.
+        @param $groupName name of the group.
+        @param $max_pages Maximum number of pages fetched, None for no limit.
+        @return PageIterator yielding the detected applications. Its error attribute is set if a page failed.
+        '''
+        return PageIterator(lambda page: self.list_group_detected_apps(page, groupName),
+                            PageIterator.detection_items, max_pages=max_pages, prefetch=prefetch)
+
     def unsubscribe_public_filter(self, filter_id):
         '''
         With this method you can subscribe to filter.
         @param $filter_id id to filter you want subscribe.
         '''
         result = ExternalApiFilterRequest(ExternalApiFilterRequest.UNSUBSCRIBE_REQUEST, None, 0, filter_id)
-        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_dict_filter_for_content_based_requests())
+        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_dict_filter_for_content_based_requests(), retry=False)
 
     def subscribe_public_filter(self, filter_id):
         '''
@@ -178,7 +250,7 @@ class TacytApp(Auth):
         @param $filter_id id to filter you want unsubscribe.
         '''
         result = ExternalApiFilterRequest(ExternalApiFilterRequest.SUBSCRIBE_REQUEST, None, 0, filter_id)
-        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_dict_filter_for_content_based_requests())
+        return self.http_post(self.API_FILTERS_URL, None, body=result.get_json_encode_dict_filter_for_content_based_requests(), retry=False)
 
     def get_RSS_info(self, filter_id):
         '''
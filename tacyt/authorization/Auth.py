@@ -6,6 +6,8 @@ import json
 import hashlib
 from authorization.Response import Response
 from tacyt.Version import Version
+from ConnectionPool import ConnectionPool
+from RequestScheduler import RequestScheduler, CircuitOpenError
 import Error
 
 class Auth(object):
@@ -39,15 +41,19 @@ class Auth(object):
     DATE_HEADER_NAME = X_11PATHS_HEADER_PREFIX + "Date"
     MULTIPART_FORM_DATA = "multipart/form-data"
     THREAD_POOL_SIZE = 10
+    CONNECTION_POOL = ConnectionPool()
+    REQUESTS_SESSION = None
 
-    def __init__(self, appId, secretKey):
+    def __init__(self, appId, secretKey, key_pool=None):
         '''
         Create an instance of the class with the Application ID and secret obtained from Tacyt
         @param $appId
         @param $secretKey
+        @param $key_pool Optional KeyPool spreading the requests across several API keys
         '''
         self.appId = appId
         self.secretKey = secretKey
+        self.key_pool = key_pool
 
     @staticmethod
     def set_host(host):
@@ -75,6 +81,24 @@ class Auth(object):
         Auth.API_PROXY = proxy
         Auth.API_PROXY_PORT = port
 
+    @staticmethod
+    def set_connection_pool(max_size=ConnectionPool.DEFAULT_MAX_SIZE, idle_timeout=ConnectionPool.DEFAULT_IDLE_TIMEOUT):
+        '''
+        Replace the shared keep-alive connection pool used by every request
+        @param $max_size Maximum number of idle connections kept per host, port and proxy. 0 disables reuse.
+        @param $idle_timeout Seconds an idle connection is kept before being closed
+        '''
+        Auth.CONNECTION_POOL.clear()
+        Auth.CONNECTION_POOL = ConnectionPool(max_size, idle_timeout)
+
+    @staticmethod
+    def get_connection_key():
+        '''
+        @return the connection pool key for the current host, port and proxy settings
+        '''
+        return ConnectionPool.get_key(Auth.API_HTTPS, Version.API_HOST, Auth.API_PORT,
+                                      Auth.API_PROXY, Auth.API_PROXY_PORT)
+
     @staticmethod
     def get_part_from_header(part, header):
         '''
@@ -189,44 +213,23 @@ class Auth(object):
         '''
         return time.strftime(Auth.UTC_STRING_FORMAT, time.gmtime())
 
-    def _http(self, method, url, x_headers=None, body=None, file=None, content_type=None):
+    def prepare_request(self, method, url, x_headers=None, body=None, file=None, content_type=None):
         '''
-        HTTP Request to the specified API endpoint
+        Build the signed request for the specified API endpoint without sending it
         @param method string
         @param x_headers list
         @param body dict json
-        @return TacytResponse
+        @return a tuple (url, json encoded body, headers) ready to be sent
         '''
 
         auth_headers = None
         json_body = None
 
-        try:
-            # Try to use the new Python3 HTTP library if available
-            import http.client as http
-            import urllib.parse as urllib
-        except:
-            # Must be using Python2 so use the appropriate library
-            import httplib as http
-            import urllib
-
-        if Auth.API_PROXY != None:
-            if Auth.API_HTTPS:
-                conn = http.HTTPSConnection(Auth.API_PROXY, Auth.API_PROXY_PORT)
-                conn.set_tunnel(Version.API_HOST, Auth.API_PORT)
-            else:
-                conn = http.HTTPConnection(Auth.API_PROXY, Auth.API_PROXY_PORT)
-                url = "http://" + Version.API_HOST + url
-        else:
-            if Auth.API_HTTPS:
-                conn = http.HTTPSConnection(Version.API_HOST, Auth.API_PORT)
-            else:
-                conn = http.HTTPConnection(Version.API_HOST, Auth.API_PORT)
-
+        if Auth.API_PROXY != None and not Auth.API_HTTPS:
+            url = "http://" + Version.API_HOST + url
 
         if self.HTTP_METHOD_GET == method or self.HTTP_METHOD_DELETE == method:
             auth_headers = self.authentication_headers(method, url, x_headers, None, None)
-            conn.request(method, url, headers=auth_headers)
 
         elif self.HTTP_METHOD_POST == method or self.HTTP_METHOD_PUT == method:
 
@@ -235,26 +238,74 @@ class Auth(object):
                 auth_headers = self.authentication_headers_with_body(method, url, x_headers, json_body, None)
                 auth_headers[self.HTTP_HEADER_CONTENT_TYPE] = content_type
 
+        return url, json_body, auth_headers
+
+    def get_request_scheduler(self):
+        '''
+        @return the RequestScheduler rate limiting and retrying the requests sent with this API key
+        '''
+        return RequestScheduler.for_key(self.appId)
+
+    def get_signer(self):
+        '''
+        @return the Auth instance the next request is signed and scheduled with, None if every key of
+            the key pool is failing
+        '''
+        if self.key_pool is None:
+            return self
+        return self.key_pool.acquire()
+
+    @staticmethod
+    def error_response(code, message):
+        '''
+        @return a Response carrying only the given error
+        '''
+        return Response(error=Error.Error({"code": code, "message": message}))
+
+    @staticmethod
+    def build_response(status, response_data):
+        '''
+        @return the Response for a raw HTTP answer. Non JSON answers become an error with the HTTP status as code.
+        '''
         try:
+            return Response(json_string=response_data.decode('utf8'))
+        except ValueError:
+            return Auth.error_response(str(status), "Unexpected response from the API (HTTP " + str(status) + ")")
+
+    def _http(self, method, url, x_headers=None, body=None, file=None, content_type=None, retry=True):
+        '''
+        HTTP Request to the specified API endpoint.
+        Requests are signed with a key from the key pool, if any, and paced and retried by the
+        RequestScheduler of that key.
+        @param method string
+        @param x_headers list
+        @param body dict json
+        @param retry False for requests that change data on the server, see RequestScheduler.call
+        @return TacytResponse, with an error if the request failed
+        '''
 
-            all_headers = auth_headers
+        signer = self.get_signer()
+        if signer is None:
+            return Auth.error_response(RequestScheduler.CIRCUIT_OPEN_ERROR_CODE,
+                                       RequestScheduler.CIRCUIT_OPEN_ERROR_MESSAGE)
 
-            if body is not None:
-                conn.request(method=method, url=url, body=json_body, headers=all_headers)
+        def send():
+            # Sign on every attempt so retries carry a fresh date header
+            request_url, json_body, auth_headers = signer.prepare_request(method, url, x_headers, body, file, content_type)
+            return Auth.CONNECTION_POOL.request(Auth.get_connection_key(), method, request_url,
+                                                body=json_body, headers=auth_headers)
 
-            res = conn.getresponse()
-            response_data = res.read().decode('utf8')
+        try:
+            status, response_data = signer.get_request_scheduler().call(send, retry)
 
-            conn.close()
-            ret = Response(json_string=response_data)
+        except CircuitOpenError, e:
+            return Auth.error_response(RequestScheduler.CIRCUIT_OPEN_ERROR_CODE, str(e))
 
         except Exception, e:
-            print "Exception"
-            print e
-            print repr(e)
-            ret = None
+            logging.error("Request to " + url + " failed: " + repr(e))
+            return Auth.error_response("-1", repr(e))
 
-        return ret
+        return Auth.build_response(status, response_data)
 
     def sign_data(self, data):
         '''
@@ -402,14 +453,14 @@ class Auth(object):
         else:
             return ""
 
-    def http_delete(self, url, headers, body):
-        return self._http(self.HTTP_METHOD_DELETE, url, headers, body)
+    def http_delete(self, url, headers, body, retry=True):
+        return self._http(self.HTTP_METHOD_DELETE, url, headers, body, retry=retry)
 
-    def http_post(self, url, headers, data=None, body=None):
+    def http_post(self, url, headers, data=None, body=None, retry=True):
         if data is not None:
-            return self._http(self.HTTP_METHOD_POST,url,  headers, data)
+            return self._http(self.HTTP_METHOD_POST,url,  headers, data, retry=retry)
         elif body:
-            return self._http(self.HTTP_METHOD_POST,url,  headers, body, None, self.HTTP_HEADER_CONTENT_TYPE_JSON)
+            return self._http(self.HTTP_METHOD_POST,url,  headers, body, None, self.HTTP_HEADER_CONTENT_TYPE_JSON, retry)
 
     def http_post_file(self, url, headers, file_stream, file_name, tag_name):
         try:
@@ -429,18 +480,23 @@ class Auth(object):
         else:
             proxies = None
 
+        # Share one keep-alive session for uploads as well
+        if Auth.REQUESTS_SESSION is None:
+            Auth.REQUESTS_SESSION = requests.Session()
+        session = Auth.REQUESTS_SESSION
+
         if tag_name is None:
-            res = requests.post(url, headers=headers, files=files, proxies=proxies)
+            res = session.post(url, headers=headers, files=files, proxies=proxies)
         else:
-            res = requests.post( url, headers=headers, files=files, data={'tagName': tag_name}, proxies=proxies)
+            res = session.post( url, headers=headers, files=files, data={'tagName': tag_name}, proxies=proxies)
         res.raise_for_status()
 
         response_data = Response(json_string=res.content)
 
         return response_data
 
-    def http_put(self, url, headers, data=None, body=None):
+    def http_put(self, url, headers, data=None, body=None, retry=True):
         if data is not None:
-            return self._http(self.HTTP_METHOD_PUT,url,  headers, data)
+            return self._http(self.HTTP_METHOD_PUT,url,  headers, data, retry=retry)
         elif body is not None:
-            return self._http(self.HTTP_METHOD_PUT,url,  headers, body, None, self.HTTP_HEADER_CONTENT_TYPE_JSON)
+            return self._http(self.HTTP_METHOD_PUT,url,  headers, body, None, self.HTTP_HEADER_CONTENT_TYPE_JSON, retry)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+This library offers an API to use Tacyt in a python environment.
+Copyright (C) 2015 Eleven Paths
+'''
+
+import threading
+import time
+
+try:
+    # Try to use the new Python3 HTTP library if available
+    import http.client as http
+except ImportError:
+    # Must be using Python2 so use the appropriate library
+    import httplib as http
+
+
+class ConnectionPool(object):
+    '''
+    Thread-safe pool of keep-alive HTTP(S) connections.
+    Idle connections are kept per (https, host, port, proxy, proxy_port) key so consecutive
+    requests to the API reuse the same TCP and TLS session instead of opening a new one.
+    '''
+
+    DEFAULT_MAX_SIZE = 10
+    DEFAULT_IDLE_TIMEOUT = 30
+
+    # Errors raised by httplib when a kept-alive socket was closed by the other end
+    STALE_CONNECTION_ERRORS = (http.BadStatusLine, http.CannotSendRequest,
+                               http.ResponseNotReady, IOError)
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        '''
+        @param $max_size Maximum number of idle connections kept for each key. 0 disables pooling.
+        @param $idle_timeout Seconds an idle connection may stay in the pool before being discarded.
+        '''
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = dict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_key(https, host, port, proxy=None, proxy_port=None):
+        '''
+        @return the tuple identifying the connections that can be shared for this destination
+        '''
+        return (https, host, port, proxy, proxy_port)
+
+    @staticmethod
+    def create_connection(key):
+        '''
+        Open a new connection for the given pool key. Connecting is deferred to the first request.
+        '''
+        https, host, port, proxy, proxy_port = key
+        if proxy is not None:
+            if https:
+                conn = http.HTTPSConnection(proxy, proxy_port)
+                conn.set_tunnel(host, port)
+            else:
+                conn = http.HTTPConnection(proxy, proxy_port)
+        else:
+            if https:
+                conn = http.HTTPSConnection(host, port)
+            else:
+                conn = http.HTTPConnection(host, port)
+        return conn
+
+    def acquire(self, key):
+        '''
+        @return a tuple (connection, reused). reused is True when the connection comes from the pool
+            and may therefore have been closed by the server in the meantime.
+        '''
+        now = time.time()
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                candidate, last_used = idle.pop()
+                if now - last_used > self.idle_timeout:
+                    expired.append(candidate)
+                else:
+                    conn = candidate
+                    break
+        for stale in expired:
+            stale.close()
+        if conn is not None:
+            return conn, True
+        return ConnectionPool.create_connection(key), False
+
+    def release(self, key, conn):
+        '''
+        Return a connection whose response has been fully read so it can be reused.
+        '''
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_size:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def discard(self, conn):
+        '''
+        Close a connection that can't be reused.
+        '''
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def clear(self):
+        '''
+        Close every idle connection in the pool.
+        '''
+        with self._lock:
+            idle, self._idle = self._idle, dict()
+        for connections in idle.values():
+            for conn, last_used in connections:
+                self.discard(conn)
+
+    def request(self, key, method, url, body=None, headers=None):
+        '''
+        Send a request through a pooled connection and read the whole response.
+        If a reused connection turns out to be stale, the request is retried once on a fresh one.
+        @return a tuple (status, response body as bytes)
+        '''
+        if headers is None:
+            headers = dict()
+        while True:
+            conn, reused = self.acquire(key)
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                res = conn.getresponse()
+                data = res.read()
+            except self.STALE_CONNECTION_ERRORS:
+                self.discard(conn)
+                if reused:
+                    continue
+                raise
+            except Exception:
+                self.discard(conn)
+                raise
+
+            if res.will_close:
+                self.discard(conn)
+            else:
+                self.release(key, conn)
+            return res.status, data
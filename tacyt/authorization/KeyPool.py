@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+This library offers an API to use Tacyt in a python environment.
+Copyright (C) 2015 Eleven Paths
+'''
+
+import itertools
+import threading
+
+
+class KeyPool(object):
+    '''
+    Spreads requests across several API credentials.
+    Each credential is an Auth instance, so it signs with its own key and is paced and guarded by
+    its own RequestScheduler. Credentials whose circuit breaker is open are skipped.
+    '''
+
+    ROUND_ROBIN = "ROUND_ROBIN"
+    QUOTA = "QUOTA"
+
+    def __init__(self, signers, strategy=ROUND_ROBIN):
+        '''
+        @param $signers list of Auth instances, one per API key
+        @param $strategy ROUND_ROBIN to rotate through the keys, QUOTA to pick the key with most
+            rate limit tokens left
+        '''
+        if not signers:
+            raise ValueError("A key pool needs at least one credential")
+        self.signers = list(signers)
+        self.strategy = strategy
+        self._order = itertools.cycle(range(len(self.signers)))
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.signers)
+
+    def acquire(self):
+        '''
+        @return the Auth instance to sign the next request with, or None if every key is failing
+        '''
+        if self.strategy == KeyPool.QUOTA:
+            ranked = sorted(self.signers, key=lambda signer: -signer.get_request_scheduler().available())
+        else:
+            with self._lock:
+                start = next(self._order)
+            ranked = self.signers[start:] + self.signers[:start]
+
+        for signer in ranked:
+            if signer.get_request_scheduler().breaker.available():
+                return signer
+        return None
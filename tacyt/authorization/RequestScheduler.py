@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+This library offers an API to use Tacyt in a python environment.
+Copyright (C) 2015 Eleven Paths
+'''
+
+import random
+import threading
+import time
+
+try:
+    # Try to use the new Python3 HTTP library if available
+    import http.client as http
+except ImportError:
+    # Must be using Python2 so use the appropriate library
+    import httplib as http
+
+
+class CircuitOpenError(Exception):
+    '''
+    Raised when a request is rejected because the circuit breaker of its API key is open.
+    '''
+    pass
+
+
+class TokenBucket(object):
+    '''
+    Thread-safe token bucket allowing `rate` requests per second with bursts of up to `burst` requests.
+    '''
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        '''
+        Take a token, borrowing from the future if the bucket is empty.
+        @return the number of seconds to wait before sending the request
+        '''
+        with self._lock:
+            self._refill(time.time())
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def available(self):
+        '''
+        @return the number of tokens currently available, negative if requests are queued
+        '''
+        with self._lock:
+            self._refill(time.time())
+            return self._tokens
+
+
+class CircuitBreaker(object):
+    '''
+    Stops sending requests after `failure_threshold` consecutive failures.
+    After `reset_timeout` seconds a single trial request is let through: the circuit closes
+    again if it succeeds, and stays open for another timeout if it fails.
+    '''
+
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitBreaker.CLOSED
+        self.failures = 0
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        '''
+        @return True if a request may be sent now
+        '''
+        with self._lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return True
+            if self.state == CircuitBreaker.OPEN and time.time() - self._opened >= self.reset_timeout:
+                self.state = CircuitBreaker.HALF_OPEN
+                return True
+            return False
+
+    def available(self):
+        '''
+        @return True if allow() would let a request through, without changing the state
+        '''
+        with self._lock:
+            if self.state == CircuitBreaker.CLOSED:
+                return True
+            return self.state == CircuitBreaker.OPEN and time.time() - self._opened >= self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = CircuitBreaker.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == CircuitBreaker.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = CircuitBreaker.OPEN
+                self._opened = time.time()
+
+
+class RequestScheduler(object):
+    '''
+    Paces, retries and guards the requests sent with one API key.
+    Requests are rate limited with a token bucket. Network errors and HTTP 429/5xx answers are
+    retried with jittered exponential backoff, and a circuit breaker fails fast while the API
+    keeps failing. Requests that change data on the server are sent with retry=False: they are
+    only retried on HTTP 429, which the server answers without processing the request, so a
+    timeout after the change was committed never repeats it.
+    '''
+
+    DEFAULT_RATE = 10.0
+    DEFAULT_BURST = 10
+    DEFAULT_MAX_RETRIES = 5
+    DEFAULT_BACKOFF_BASE = 0.5
+    DEFAULT_BACKOFF_MAX = 30.0
+    DEFAULT_FAILURE_THRESHOLD = 10
+    DEFAULT_RESET_TIMEOUT = 60.0
+
+    RETRY_STATUS = (429, 500, 502, 503, 504)
+    UNPROCESSED_STATUS = (429,)
+    TRANSIENT_ERRORS = (IOError, http.HTTPException)
+
+    CIRCUIT_OPEN_ERROR_CODE = "-3"
+    CIRCUIT_OPEN_ERROR_MESSAGE = "Too many consecutive failures, requests are paused."
+
+    _schedulers = dict()
+    _schedulers_lock = threading.Lock()
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, max_retries=DEFAULT_MAX_RETRIES,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_TIMEOUT):
+        '''
+        @param $rate Sustained requests per second, None to disable rate limiting
+        @param $burst Requests that can be sent at once before the rate applies
+        @param $max_retries Retries of a failed request before giving up
+        @param $backoff_base Seconds waited before the first retry, doubled on each attempt
+        @param $backoff_max Upper bound of the wait between retries
+        @param $failure_threshold Consecutive failures that open the circuit breaker
+        @param $reset_timeout Seconds the circuit stays open before a trial request
+        '''
+        self.bucket = None
+        if rate is not None:
+            self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    @staticmethod
+    def for_key(app_id):
+        '''
+        @return the scheduler shared by every client using the given API key
+        '''
+        with RequestScheduler._schedulers_lock:
+            scheduler = RequestScheduler._schedulers.get(app_id)
+            if scheduler is None:
+                scheduler = RequestScheduler()
+                RequestScheduler._schedulers[app_id] = scheduler
+            return scheduler
+
+    @staticmethod
+    def configure(app_id, **kwargs):
+        '''
+        Replace the scheduler of an API key. Keyword arguments are those of the constructor.
+        @return the new scheduler
+        '''
+        scheduler = RequestScheduler(**kwargs)
+        with RequestScheduler._schedulers_lock:
+            RequestScheduler._schedulers[app_id] = scheduler
+        return scheduler
+
+    def reserve(self):
+        '''
+        @return seconds to wait before the next request may be sent
+        '''
+        if self.bucket is None:
+            return 0.0
+        return self.bucket.reserve()
+
+    def available(self):
+        '''
+        @return the request tokens currently available for this key, infinite when not rate limited
+        '''
+        if self.bucket is None:
+            return float("inf")
+        return self.bucket.available()
+
+    def backoff(self, attempt):
+        '''
+        @return seconds to wait before retry number `attempt` (starting at 0), with full jitter
+        '''
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def is_retryable_status(self, status, retry=True):
+        if retry:
+            return status in self.RETRY_STATUS
+        return status in self.UNPROCESSED_STATUS
+
+    def call(self, send, retry=True):
+        '''
+        Send a request through the scheduler.
+        @param $send Function sending the request and returning a tuple (status, data)
+        @param $retry False for requests that are not idempotent, only retried on HTTP 429
+        @return the (status, data) tuple of the last attempt
+        @raise CircuitOpenError if the circuit breaker is open, the last transient error, or any
+        other error raised by send, which is not retried
+        '''
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(self.CIRCUIT_OPEN_ERROR_MESSAGE)
+            delay = self.reserve()
+            if delay > 0:
+                time.sleep(delay)
+
+            try:
+                status, data = send()
+            except self.TRANSIENT_ERRORS:
+                self.breaker.record_failure()
+                if not retry or attempt >= self.max_retries:
+                    raise
+            except Exception:
+                # Not retried, but still a failure: a half open breaker must
+                # not wait forever for the outcome of its trial request
+                self.breaker.record_failure()
+                raise
+            else:
+                if not self.is_retryable_status(status, retry):
+                    self.breaker.record_success()
+                    return status, data
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    return status, data
+
+            time.sleep(self.backoff(attempt))
+            attempt += 1
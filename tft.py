@@ -27,12 +27,21 @@ from __future__ import division
 import os
 from tacyt import TacytApp as ta
 import json
-import tflearn
+import math
 import numpy as np
-import random
-import hashlib
+import zlib
 import pickle
+import threading
+from multiprocessing.pool import ThreadPool
 from tftutils import TFTUtils
+from tftschema import FeatureSchema, Projection
+from tftapps import AppTable
+from tftscaler import Scaler
+from tftsplit import DataSplit
+from tftstore import DatasetStore, DatasetIndex, DatasetView
+from tftinference import InferenceModel
+from tftsparse import ModelInput
+from tftmetrics import Metrics
 
 
 class TFTacyt(object):
@@ -41,21 +50,53 @@ class TFTacyt(object):
     See example.py for usage information.
     """
 
-    def __init__(self, api, categories, verbosity=0):
+    # Results requested per page and maximum pages fetched per search
+    PAGE_SIZE = 100
+    MAX_PAGES = 10
+    # Field identifying an app in Tacyt results
+    KEY_FIELD = 'key'
+    # Default model and training hyperparameters, see createModel and
+    # trainModel, and tfttune.py to search for better ones
+    HIDDEN_LAYERS = [32, 32]
+    HIDDEN_ACTIVATION = 'linear'
+    LEARNING_RATE = 0.0001
+    N_EPOCH = 1000
+    BATCH_SIZE = 32
+
+    # maxInFlight limits the number of concurrent API requests made by
+    # the instance across all worker threads, None for no limit.
+    # sparseFeatures is an optional tftsparse.SparseFeatures encoding list
+    # fields such as permissionName into sparse columns (needs scipy).
+    def __init__(self, api, categories, verbosity=0, maxInFlight=None, sparseFeatures=None):
         # Instantiate
         self.api = api
         self.categories = categories
         self.verbosity = verbosity
-        self.DATA = []
-        self.LABELS = -1
+        self.inFlight = None
+        if maxInFlight is not None:
+            self.inFlight = threading.BoundedSemaphore(maxInFlight)
+        self.schema = FeatureSchema(self.categories)
+        self.DATA = self.schema.emptyMatrix()
+        self.LABELS = FeatureSchema.buildLabels(0)
+        self.KEYS = FeatureSchema.buildKeys([])
+        self.TESTKEYS = FeatureSchema.buildKeys([])
+        self.sparse = sparseFeatures
+        self.SPARSE = None
+        if self.sparse is not None:
+            self.SPARSE = self.sparse.empty()
+        self.INDEX = None
         self.MODEL = None
+        self.LAYERS = []
+        self.ACTIVATIONS = []
+        self.SCALER = None
         self.Util = TFTUtils(self.verbosity)
-        self.vPrint(('Categories: ' + str(self.categories)), self.Util.DEBUG)
+        self.vPrint('Categories: %s', self.Util.DEBUG, self.categories)
 
-    # Use as shorthand for printing informational/debug
-    # stuff, will only print when VERBOSE = True
-    def vPrint(self, message, verbosity=TFTUtils.DEBUG):
-        self.Util.vPrint(message, verbosity)
+    # Use as shorthand for logging informational/debug stuff, only
+    # output up to the verbosity of the instance. Values are passed
+    # as args and only %-formatted into message when output.
+    def vPrint(self, message, verbosity=TFTUtils.DEBUG, *args):
+        self.Util.vPrint(message, verbosity, *args)
 
     # Get the categories to learn from the given file and return it.
     # This allows you to easily select which criteria will be used
@@ -75,49 +116,45 @@ class TFTacyt(object):
 
     # Given a results json from tacyt and a list of categories to
     # learn from, return a list of dictionaries for each app with
-    # any key not in the list of categories removed.
+    # only the keys in the list of categories.
     # If categories are not specified, return all.
     # If a category is not found, it will be instantiated with the notFound var.
     # If notFound is None, no replacement will be made
+    # The results are not modified, see tftschema.Projection and
+    # benchmarks/projection_bench.py.
     @staticmethod
     def getFormattedApplicationsFromResults(results, categories=[], notFound=None):
-        apps = []
-        categoriesLen = len(categories)
-        for app in results['result']['applications']:
-            if categoriesLen:
-                for key in app.keys():
-                    # Remove any keys not in categories
-                    if key not in categories:
-                        app.pop(key, None)
-                apps.append(app)
-            else:
-                apps.append(app)
-        if notFound is not None:
-            for app in apps:
-                appKeys = app.keys()
-                for cat in categories:
-                    if cat not in appKeys:
-                        app[cat] = notFound
-        return apps
+        return Projection(categories, notFound).projectAll(results['result']['applications'])
 
-    # Takes the strings in app descriptions and hashes them to unique
-    # integer values. Should be normalized after. Usefullness will
-    # depend on the model you use.
+    # Same as getFormattedApplicationsFromResults for a single app dict
+    @staticmethod
+    def getFormattedApplication(app, categories=[], notFound=None):
+        return Projection(categories, notFound).project(app)
+
+    # Takes the strings in app descriptions and hashes them to 32-bit
+    # integer values with crc32. Should be normalized after. A hash is
+    # an id rather than a magnitude, so for the model prefer hashing the
+    # strings into sparse columns with tftsparse.HashingEncoder.
+    # An AppTable holds no strings and is returned as is.
     @staticmethod
     def hashAppStrings(apps):
+        if isinstance(apps, AppTable):
+            return apps
         for app in apps:
             for key in app.keys():
                 if not (type(app[key]) == int or type(app[key]) == float):
-                    app[key] = int(
-                        hashlib.md5(app[key].encode('utf-8')).hexdigest(),
-                        16)
+                    app[key] = zlib.crc32(app[key].encode('utf-8')) & 0xffffffff
         return apps
 
     # Given a list of dictionaries corresponding to apps,
     # remove all elements from those dictionaries that are not ints
     # or set them to a specific int
+    # An AppTable only holds numbers, with setTo its missing values are
+    # set to it instead.
     @staticmethod
     def getIntFilteredAppDict(apps, setTo=None):
+        if isinstance(apps, AppTable):
+            return apps if setTo is None else apps.fillMissing(setTo)
         if setTo is None:
             for app in apps:
                 for key in app.keys():
@@ -133,8 +170,19 @@ class TFTacyt(object):
     # Create a training data set from a list of app dicts
     # Returns data, a list of lists sorted the same for each app
     # and the labels for the categories [malicious, benign]
+    # If a FeatureSchema is given, data is instead a float32 matrix with
+    # the schema's columns, missing and non-numeric values set to -1.
+    # From an AppTable, data is always a float32 matrix, with the sorted
+    # fields of the table without a schema.
     @staticmethod
-    def createTrainingSet(apps, malicious=False):
+    def createTrainingSet(apps, malicious=False, schema=None):
+        if isinstance(apps, AppTable):
+            columns = sorted(apps.fields) if schema is None else schema.columns
+            return (apps.matrix(columns),
+                    FeatureSchema.buildLabels(len(apps), malicious=malicious))
+        if schema is not None:
+            return (schema.buildMatrix(apps),
+                    FeatureSchema.buildLabels(len(apps), malicious=malicious))
         data = []
         if malicious:
             labels = np.repeat(np.array([[1., 0.]]), [len(apps)], axis=0)
@@ -151,18 +199,24 @@ class TFTacyt(object):
     # list of dicts given. Used for debugging that the damn thing works.
     @staticmethod
     def setAllValues(apps, value=True):
+        if isinstance(apps, AppTable):
+            return apps.setAllValues(value)
         for app in apps:
             for key in app:
                 app[key] = value
         return apps
 
-    # Normalize the relative values for each app to each other
+    # Normalize the relative values for each app to each other, dividing
+    # them by the largest value of the app
     # only works if all values are int or float
     @staticmethod
     def normalizeByApp(apps, nValue=1.0):
+        if isinstance(apps, AppTable):
+            return apps.normalizeByApp(nValue)
         for app in apps:
-            maxValue = max(app)
-            maxValue = app[maxValue]
+            if not app:
+                continue
+            maxValue = max(app.values())
             if maxValue == 0:
                 maxValue = 1
             for key in app:
@@ -173,6 +227,8 @@ class TFTacyt(object):
     # for that category. Only works if all values are int or float.
     @staticmethod
     def normalizeByCategory(apps, nValue=1.0):
+        if isinstance(apps, AppTable):
+            return apps.normalizeByCategory(nValue)
         maxValue = 0
         for key in apps[0].keys():
             # Find max
@@ -189,68 +245,200 @@ class TFTacyt(object):
         return apps
 
     # Same as the normalizeByCategory function, except for operating
-    # on the data list of lists, instead of the apps list of dicts
-    def normalizeDataByCategory(self, data, nValue=100.0):
-        maxValue = 0
-        for i in range(len(data[0])):
-            for app in data:
-                if app[i] > maxValue:
-                    maxValue = app[i]
-                    self.vPrint("Staged max: " + str(maxValue), self.Util.DEBUG)
-            # Normalize
-            self.vPrint("Max value: " + str(maxValue), self.Util.DEBUG)
-            if maxValue == 0:
-                maxValue = 1
-            for app in data:
-                app[i] = (app[i] / float(maxValue)) * nValue
-                self.vPrint("New normal: " + str(app[i]), self.Util.DEBUG)
-            maxValue = 0
+    # on the data matrix instead of the apps list of dicts.
+    # The fitted scaler is kept in self.SCALER to scale new data the same way.
+    def normalizeDataByCategory(self, data, nValue=100.0, method=Scaler.MAX):
+        self.SCALER = Scaler(method, nValue)
+        with self.Util.stage('normalize', rows=len(data), method=method):
+            data = self.SCALER.fitTransform(data)
+        self.vPrint("Column scale: %s", self.Util.DEBUG, self.SCALER.scale)
         return data
 
+    # Fetch a single page of results for the given string and format
+    # it with the given fields, the categories of the instance by default.
+    # Only those fields are requested from the API, see
+    # benchmarks/outfields_bench.py for the savings.
+    # Returns an (apps, numresults) pair, numresults being the total
+    # number of results of the search if the API reports it, or None if
+    # the request failed.
+    def fetchPage(self, searchString, page, fields=None):
+        if fields is None:
+            fields = self.categories
+        self.vPrint("Searching for %s page %d", self.Util.DEBUG, searchString, page)
+        if self.inFlight is None:
+            search = self.api.search_apps(searchString, maxResults=self.PAGE_SIZE,
+                                          numberPage=page, outfields=fields)
+        else:
+            with self.inFlight:
+                search = self.api.search_apps(searchString, maxResults=self.PAGE_SIZE,
+                                              numberPage=page, outfields=fields)
+        # Failed requests were already retried by the API client, give up on
+        # the remaining pages of this term rather than the whole crawl.
+        if search is None or search.get_error():
+            self.vPrint("Search for %s page %d failed: %s", self.Util.ERROR,
+                        searchString, page, search and search.get_error())
+            return None
+        data = search.get_data()
+        total = (data or {}).get('result', {}).get('numresults')
+        return self.getFormattedApplicationsFromResults(
+            data,
+            categories=fields,
+            notFound=-1), total
+
+    # Same as fetchPage without the total, with no results if the request
+    # failed
+    def searchPage(self, searchString, page, fields=None):
+        search = self.fetchPage(searchString, page, fields)
+        return [] if search is None else search[0]
+
+    # Number of pages of a search, from its total number of results and
+    # the size of its first page. Without a total, pages are fetched until
+    # the first short one.
+    def pageCount(self, total, firstPage):
+        if firstPage < self.PAGE_SIZE:
+            return 1
+        if total is None:
+            return self.MAX_PAGES
+        return max(1, min(self.MAX_PAGES, int(math.ceil(total / self.PAGE_SIZE))))
+
     # Search for 1000 entries for the given string and format it with
-    # the given categories argument
-    def maxSearch(self, searchString=''):
-        api = self.api
-        categories = self.categories
-        results = []
-        for i in range(10):
-            self.vPrint("Searching for " + searchString + " page " + str(i+1), self.Util.DEBUG)
-            search = api.search_apps(searchString, maxResults=100, numberPage=i+1)
-            search = self.getFormattedApplicationsFromResults(
-                search.get_data(),
-                categories=categories,
-                notFound=-1)
-            results.extend(search)
-        return results
+    # the given categories argument.
+    # The first page gives the number of results, so only the pages that
+    # exist are requested. Paging also stops at the first short page.
+    # With workers > 1, up to that many of the following pages are fetched
+    # at once on a thread pool and the results are still returned in page
+    # order.
+    def maxSearch(self, searchString='', workers=1, fields=None):
+        return self.searchTerm(searchString, workers, fields)[0]
+
+    # Same as maxSearch, returning a (results, complete) pair, complete
+    # being False if a page failed and the remaining pages were skipped
+    def searchTerm(self, searchString='', workers=1, fields=None):
+        first = self.fetchPage(searchString, 1, fields)
+        if first is None:
+            return [], False
+        results = list(first[0])
+        pages = self.pageCount(first[1], len(results))
+        if workers <= 1 or pages <= 2:
+            for page in range(2, pages + 1):
+                search = self.fetchPage(searchString, page, fields)
+                if search is None:
+                    return results, False
+                results.extend(search[0])
+                if len(search[0]) < self.PAGE_SIZE:
+                    break
+            return results, True
+        pool = ThreadPool(min(workers, pages - 1))
+        try:
+            pending = {}
+            nextPage = 2
+            for page in range(2, pages + 1):
+                # Keep at most `workers` pages in flight ahead of the consumer
+                while nextPage <= pages and len(pending) < workers:
+                    pending[nextPage] = pool.apply_async(self.fetchPage,
+                                                         (searchString, nextPage, fields))
+                    nextPage = nextPage + 1
+                search = pending.pop(page).get()
+                if search is None:
+                    return results, False
+                results.extend(search[0])
+                if len(search[0]) < self.PAGE_SIZE:
+                    break
+        finally:
+            pool.close()
+            pool.join()
+        return results, True
+
+    # Iterate lazily over every app found for the given string, formatted
+    # with the given fields, the categories of the instance by default.
+    # The next page is fetched while the current one is consumed, so apps
+    # can be processed as a constant-memory stream. Like maxSearch, at most
+    # MAX_PAGES pages are fetched.
+    def iterApps(self, searchString='', fields=None):
+        if fields is None:
+            fields = self.categories
+        apps = self.api.iter_search_apps(searchString, maxResults=self.PAGE_SIZE, outfields=fields,
+                                         max_pages=self.MAX_PAGES)
+        projection = Projection(fields, notFound=-1)
+        for app in apps:
+            yield projection.project(app)
+        if apps.error:
+            self.vPrint("Search for %s failed: %s", self.Util.ERROR, searchString, apps.error)
+
+    # Stream every app found for the given string into an AppTable of the
+    # categories, keeping the app keys
+    def searchAppTable(self, searchString=''):
+        return AppTable.fromApps(self.iterApps(searchString, fields=self.searchFields()),
+                                 self.categories, keyField=self.KEY_FIELD)
 
     # Randomize data and labels, very important for training if you
     # build your data sets per category.
     @staticmethod
     def randomizeData(data, labels):
-        a = []
-        b = []
-        combined = list(zip(data, labels))
-        random.shuffle(combined)
-        a[:], b[:] = zip(*combined)
-        b = np.array(b)
-        return a, b
+        order = np.random.permutation(len(data))
+        return np.asarray(data)[order], np.asarray(labels)[order]
+
+    # Fields requested for each app: the categories, the key and the
+    # fields of the sparse features
+    def searchFields(self):
+        fields = self.categories + [self.KEY_FIELD]
+        if self.sparse is not None:
+            fields = fields + [f for f in self.sparse.fields if f not in fields]
+        return fields
+
+    # Creates a data, labels, keys, sparse, complete tuple for a single
+    # search term. sparse holds the values of the sparse feature fields of
+    # each app, to be encoded in term order, None without sparse features.
+    # complete is False if a page of the term failed.
+    def createDatasetFromTerm(self, term, malicious=False, pageWorkers=1):
+        with self.Util.stage('search', term=term) as fields:
+            search, complete = self.searchTerm(searchString=term, workers=pageWorkers,
+                                               fields=self.searchFields())
+            fields['apps'] = len(search)
+            fields['complete'] = complete
+        data, labels = TFTacyt.createTrainingSet(search, malicious=malicious, schema=self.schema)
+        sparse = None
+        if self.sparse is not None:
+            sparse = self.sparse.extract(search)
+        return data, labels, FeatureSchema.buildKeys(search, self.KEY_FIELD), sparse, complete
+
+    # Returns the list of data, labels, keys, sparse, complete tuples of
+    # each search term, in the order of searchTerms
+    def createDatasetsFromTerms(self, searchTerms, malicious=False, workers=1, pageWorkers=1):
+        if workers <= 1:
+            return [self.createDatasetFromTerm(term, malicious, pageWorkers)
+                    for term in searchTerms]
+        pool = ThreadPool(workers)
+        try:
+            return pool.map(lambda term: self.createDatasetFromTerm(term, malicious, pageWorkers),
+                            searchTerms, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+    # Creates a data, labels, keys, sparse tuple from the given API and list
+    # of search terms, keys being the Tacyt key of the app in each row and
+    # sparse the list of sparse feature blocks, None without sparse features.
+    # With workers > 1 the terms are searched concurrently on a thread pool,
+    # each term fetching up to pageWorkers pages at once. Results are merged
+    # in the order of searchTerms so the dataset is the same either way.
+    def createDatasetFromList(self, searchTerms, malicious=False, workers=1, pageWorkers=1):
+        with self.Util.stage('crawl', terms=len(searchTerms), workers=workers):
+            results = self.createDatasetsFromTerms(searchTerms, malicious, workers, pageWorkers)
+        data = np.concatenate([self.schema.emptyMatrix()] + [r[0] for r in results])
+        labels = np.concatenate([FeatureSchema.buildLabels(0)] + [r[1] for r in results])
+        keys = np.concatenate([FeatureSchema.buildKeys([])] + [r[2] for r in results])
+        sparse = None
+        if self.sparse is not None:
+            sparse = self.sparse.transform([app for r in results for app in r[3]])
+        return data, labels, keys, sparse
 
     # Creates a data, labels pair from the given API and list of search terms
     # The categories should be passed as well.
-    def createDLPairFromList(self, searchTerms, malicious=False):
-        api = self.api
-        categories = self.categories
-        data = []
-        labels = -1
-        for term in searchTerms:
-            search = self.maxSearch(searchString=term)
-            search = TFTacyt.getIntFilteredAppDict(search, setTo=-1)
-            sData, sLabel = TFTacyt.createTrainingSet(search, malicious=malicious)
-            data.extend(sData)
-            if type(labels) is int:
-                labels = sLabel
-            else:
-                labels = np.append(labels, sLabel, axis=0)
+    # See createDatasetFromList for the concurrency options.
+    def createDLPairFromList(self, searchTerms, malicious=False, workers=1, pageWorkers=1):
+        data, labels, keys, sparse = self.createDatasetFromList(searchTerms, malicious,
+                                                                workers, pageWorkers)
         return data, labels
 
     #########################################################################
@@ -272,109 +460,388 @@ class TFTacyt(object):
 
     # Wrapper function for createDLPairFromList that stores data and label as
     # variables local to the TFT instance
-    def addDatasetFromTerms(self, searchTerms, malicious=False):
-        data, labels = self.createDLPairFromList(searchTerms, malicious=malicious)
-        self.DATA.extend(data)
-        if type(self.LABELS) is int:
-            self.LABELS = labels
-        else:
-            self.LABELS = np.append(self.LABELS, labels, axis=0)
+    def addDatasetFromTerms(self, searchTerms, malicious=False, workers=1, pageWorkers=1):
+        data, labels, keys, sparse = self.createDatasetFromList(
+            searchTerms, malicious=malicious, workers=workers, pageWorkers=pageWorkers)
+        self.DATA = np.concatenate((self.DATA, data))
+        self.LABELS = np.concatenate((self.LABELS, labels))
+        self.KEYS = np.concatenate((self.KEYS, keys))
+        if sparse is not None:
+            self.SPARSE = self.sparse.concat([self.SPARSE, sparse])
         return self.DATA, self.LABELS
 
-    # Save the data, labels to file
-    def saveDataset(self, filename="pickles/dataset.pickle"):
-        combined = list(zip(self.DATA, self.LABELS))
-        pickle.dump(combined, open(filename, "wb"))
+    # Incrementally add the apps found by the search terms to the dataset.
+    # Terms already synced into self.INDEX are skipped, unless their last
+    # sync is more than maxAge seconds old. Apps already seen, by Tacyt key,
+    # are skipped, or overwritten with the fresh values if upsert.
+    # Terms with a failed page keep the apps found but aren't marked as
+    # synced, so the next sync fetches them again.
+    # Returns the number of rows added and updated.
+    def syncDatasetFromTerms(self, searchTerms, malicious=False, upsert=False,
+                             maxAge=None, workers=1, pageWorkers=1):
+        if self.INDEX is None:
+            self.INDEX = DatasetIndex.fromKeys(self.KEYS)
+        terms = []
+        for term in searchTerms:
+            if term not in terms and not self.INDEX.isSynced(term, maxAge):
+                terms.append(term)
+        self.vPrint("%d of %d terms to sync", self.Util.DEBUG, len(terms), len(searchTerms))
+        results = self.createDatasetsFromTerms(terms, malicious, workers, pageWorkers)
+
+        rows = dict((key, i) for i, key in enumerate(self.KEYS) if key)
+        nextRow = len(self.KEYS)
+        added = []
+        updates = []
+        for term, (data, labels, keys, sparse, complete) in zip(terms, results):
+            new = []
+            for i, key in enumerate(keys):
+                if key in rows:
+                    if upsert:
+                        updates.append((rows[key], data[i], labels[i],
+                                        sparse[i] if sparse is not None else None))
+                elif not key or key not in self.INDEX:
+                    if key:
+                        rows[key] = nextRow
+                        self.INDEX.addApp(key, term)
+                    nextRow = nextRow + 1
+                    new.append(i)
+            added.append((data[new], labels[new], keys[new],
+                          [sparse[i] for i in new] if sparse is not None else None))
+            if complete:
+                self.INDEX.markSynced(term, malicious, len(keys))
+            else:
+                self.vPrint("Search for %s incomplete, it will be synced again",
+                            self.Util.WARNING, term)
+
+        # Concatenating copies the arrays, so memory-mapped datasets
+        # become writable for the updates
+        self.DATA = np.concatenate([self.DATA] + [a[0] for a in added])
+        self.LABELS = np.concatenate([self.LABELS] + [a[1] for a in added])
+        self.KEYS = np.concatenate([self.KEYS] + [a[2] for a in added])
+        for row, data, labels, sparse in updates:
+            self.DATA[row] = data
+            self.LABELS[row] = labels
+        if self.sparse is not None:
+            newSparse = self.sparse.transform([app for a in added for app in a[3]])
+            self.SPARSE = self.sparse.concat([self.SPARSE, newSparse])
+            if updates:
+                self.SPARSE = self.sparse.setRows(
+                    self.SPARSE, [u[0] for u in updates],
+                    self.sparse.transform([u[3] for u in updates]))
+        return sum(len(a[0]) for a in added), len(updates)
+
+    # Drop the sparse columns of values seen in fewer than minCount apps,
+    # before creating the model, to bound its input size. Raises
+    # ValueError once the model is created.
+    def pruneSparseFeatures(self, minCount):
+        self.SPARSE = self.sparse.prune(self.SPARSE, minCount)
+        self.vPrint("%d sparse columns kept", self.Util.DEBUG, self.sparse.width)
 
-    # Load the data, labels from file
-    def loadDataset(self, filename="pickles/dataset.pickle"):
+    # Save the data, labels and app keys to a columnar dataset directory,
+    # along with the sync index if there is one
+    def saveDataset(self, filename="datasets/dataset"):
+        store = DatasetStore(filename)
+        store.save(self.DATA, self.LABELS, self.KEYS, self.schema.columns)
+        if self.sparse is not None:
+            store.saveSparse(self.SPARSE, self.sparse)
+        if self.INDEX is not None:
+            store.saveIndex(self.INDEX)
+
+    # Load the data, labels and app keys from a dataset directory. With mmap
+    # the arrays are read-only views on the files, loaded on demand.
+    # Datasets pickled by older versions are still read from their file.
+    def loadDataset(self, filename="datasets/dataset", mmap=True):
+        if os.path.isfile(filename):
+            return self.loadPickledDataset(filename)
+        store = DatasetStore(filename)
+        data, labels, keys, columns = store.load(mmap=mmap)
+        if columns != self.schema.columns:
+            raise ValueError("Dataset columns " + str(columns) +
+                             " don't match the categories " + str(self.schema.columns))
+        self.DATA = data
+        self.LABELS = labels
+        self.KEYS = keys
+        # The dataset's vocabularies replace the instance's, so the
+        # sparse columns match the stored blocks
+        blocks, features = store.loadSparse(mmap=mmap)
+        if features is not None:
+            self.sparse = features
+            self.SPARSE = blocks
+        elif self.sparse is not None:
+            self.SPARSE = self.sparse.empty(len(data))
+        self.INDEX = store.loadIndex()
+        return data, labels
+
+    # Load a (row, label) list pickled by older versions of saveDataset.
+    # Those datasets have no app keys.
+    def loadPickledDataset(self, filename="pickles/dataset.pickle"):
         combined = pickle.load(open(filename, "rb"))
         a = []
         b = []
         a[:], b[:] = zip(*combined)
+        a = np.array(a, dtype=FeatureSchema.DTYPE)
         b = np.array(b)
         self.DATA = a
         self.LABELS = b
+        self.KEYS = FeatureSchema.buildKeys([{}] * len(a))
+        if self.sparse is not None:
+            self.SPARSE = self.sparse.empty(len(a))
+        self.INDEX = None
         return a, b
 
     # Preprocesses data by randomizing the order and normalizing by category
-    def preprocess(self):
-        self.DATA, self.LABELS = self.randomizeData(self.DATA, self.LABELS)
-        self.DATA = self.normalizeDataByCategory(self.DATA)
+    # with the given Scaler method. DATA becomes a DatasetView of the rows
+    # in random order, scaled one batch at a time as they are read, so a
+    # memory-mapped dataset is trained on without being copied into memory.
+    def preprocess(self, method=Scaler.MAX, nValue=100.0):
+        order = np.random.permutation(len(self.DATA))
+        self.LABELS = np.asarray(self.LABELS[order])
+        self.KEYS = np.asarray(self.KEYS[order])
+        if self.SPARSE is not None:
+            self.SPARSE = self.sparse.take(self.SPARSE, order)
+        self.SCALER = Scaler(method, nValue)
+        with self.Util.stage('normalize', rows=len(self.DATA), method=method):
+            self.SCALER.fit(self.DATA)
+        self.vPrint("Column scale: %s", self.Util.DEBUG, self.SCALER.scale)
+        data = self.DATA
+        if isinstance(data, DatasetView) and data.transform is None:
+            data, order = data.data, data.order[order]
+        self.DATA = DatasetView(data, order, self.SCALER.transform)
+
+    # Scale new data with the scaler fitted in preprocess or loaded with
+    # the model, so it matches the training data
+    def scaleData(self, data):
+        if self.SCALER is None:
+            raise ValueError("No scaler: preprocess the dataset or load a model first")
+        return self.SCALER.transform(data)
+
+    # Number of model inputs: the schema's columns, then the sparse columns
+    def inputWidth(self):
+        if self.sparse is None:
+            return len(self.schema)
+        return len(self.schema) + self.sparse.width
+
+    # Model input rows from scaled dense rows and their sparse blocks, as
+    # a tftsparse.ModelInput that makes the sparse columns dense one batch
+    # at a time. Without sparse blocks, the dense rows.
+    def modelInput(self, data, sparse=None):
+        if sparse is None:
+            return data
+        return ModelInput(data, sparse, self.sparse)
+
+    # Rows of a model input
+    @staticmethod
+    def inputRows(data, rows):
+        if isinstance(data, (ModelInput, DatasetView)):
+            return data.take(rows)
+        return data[rows]
+
+    # Model predictions for the rows of a model input, batchSize rows at
+    # a time
+    def predictInput(self, data, batchSize=4096):
+        pred = np.empty((len(data), 2), dtype=np.float32)
+        for start in range(0, len(data), batchSize):
+            rows = slice(start, start + batchSize)
+            pred[rows] = self.MODEL.predict(np.asarray(data[rows]))
+        return pred
 
     # Creates a test set of data, removed from training set
     # for validation of the model.
-    def createTestingSet(self, size=-1):
+    # size is a number of rows, or a fraction of the dataset if float.
+    # With stratify each class keeps its share in both sets, and seed
+    # holds out the same apps whatever the order of the rows. With sparse features, the test set
+    # is a model input including the sparse columns, see modelInput.
+    # After preprocess both sets are DatasetViews of the preprocessed rows.
+    def createTestingSet(self, size=-1, stratify=False, seed=None):
         if size == -1:
             size = len(self.DATA) // 10
-        testSet = []
-        testSetLabels = []
-        for i in range(size):
-            j = random.randrange(0, len(self.DATA), 1)
-            testSet.append(self.DATA.pop(j))
-            testSetLabels.append(self.LABELS[j])
-            self.LABELS = np.delete(self.LABELS, j, axis=0)
+        train, test = DataSplit.trainTestByKey(self.KEYS, self.LABELS, size,
+                                               stratify=stratify, seed=seed)
+        testSet = self.inputRows(self.DATA, test)
+        testSetLabels = self.LABELS[test]
+        self.TESTKEYS = self.KEYS[test]
+        self.DATA = self.inputRows(self.DATA, train)
+        self.LABELS = self.LABELS[train]
+        self.KEYS = self.KEYS[train]
+        if self.SPARSE is not None:
+            testSet = self.modelInput(testSet, self.sparse.take(self.SPARSE, test))
+            self.SPARSE = self.sparse.take(self.SPARSE, train)
         return testSet, testSetLabels
 
-    # Data must exist before the model is created
-    def createModel(self):
-        net = tflearn.input_data(shape=[None, len(self.DATA[0])])
-        net = tflearn.fully_connected(net, 32)
-        net = tflearn.fully_connected(net, 32)
-        net = tflearn.fully_connected(net, 2, activation='softmax')
-        adam = tflearn.optimizers.Adam(learning_rate=0.0001)
+    # The model takes one input per column of the feature schema and of
+    # the sparse features, whose vocabularies are frozen here so datasets
+    # added or synced later keep the same input width. It has a
+    # fully connected layer of each size in hiddenLayers and a softmax
+    # output. Its layers are kept in LAYERS for exportModel.
+    # tflearn, and with it TensorFlow, is only imported here so dataset
+    # building and scoring with an InferenceModel never load it.
+    def createModel(self, hiddenLayers=None, learningRate=None, activation=None):
+        import tflearn
+        if hiddenLayers is None:
+            hiddenLayers = self.HIDDEN_LAYERS
+        if learningRate is None:
+            learningRate = self.LEARNING_RATE
+        if activation is None:
+            activation = self.HIDDEN_ACTIVATION
+        self.ACTIVATIONS = [activation] * len(hiddenLayers) + ['softmax']
+        if self.sparse is not None:
+            self.sparse.freeze()
+        net = tflearn.input_data(shape=[None, self.inputWidth()])
+        self.LAYERS = []
+        for units, layerActivation in zip(list(hiddenLayers) + [2], self.ACTIVATIONS):
+            net = tflearn.fully_connected(net, units, activation=layerActivation)
+            self.LAYERS.append(net)
+        adam = tflearn.optimizers.Adam(learning_rate=learningRate)
         net = tflearn.regression(net, optimizer=adam)
         model = tflearn.DNN(net, tensorboard_verbose=self.verbosity)
         self.MODEL = model
 
-    def trainModel(self):
-        self.MODEL.fit(self.DATA,
-                       self.LABELS,
-                       n_epoch=1000,
-                       batch_size=32,
-                       show_metric=True
-                       )
+    # Train the model on the dataset for up to nEpoch epochs.
+    # validationSplit holds out that fraction of the rows, stratified,
+    # to monitor the training on. With patience, training stops once the
+    # monitored metric (TrainingMonitor.LOSS or DETECTION_RATE) hasn't
+    # improved by minDelta for that many epochs.
+    # With checkpointPath the model is saved there every checkpointEvery
+    # epochs and at the end, and resume continues from the last
+    # checkpoint if it was trained on the same data and validationSplit,
+    # validating on the same apps. seed picks the validation apps of a
+    # new training.
+    # Returns the TrainingMonitor with the final state.
+    def trainModel(self, nEpoch=None, batchSize=None, showMetric=True,
+                   validationSplit=None, monitor='loss', patience=None, minDelta=0.0,
+                   checkpointPath=None, checkpointEvery=10, resume=False, seed=None):
+        from tfttrain import TrainingMonitor
+        if nEpoch is None:
+            nEpoch = self.N_EPOCH
+        if batchSize is None:
+            batchSize = self.BATCH_SIZE
+        columns = self.schema.columns
+        if self.sparse is not None:
+            columns = columns + self.sparse.columns
+        fingerprint = TrainingMonitor.fingerprint(columns, self.LABELS, self.KEYS, self.SCALER)
+        state = None
+        if resume:
+            state = TrainingMonitor.loadState(checkpointPath)
+        # A checkpoint of other data or another validation split, even a
+        # finished one, is not resumed
+        if state is not None and (state.get('data') != fingerprint or
+                                  state.get('validationSplit') != validationSplit):
+            self.vPrint("Checkpoint %s was trained on other data or validation split, "
+                        "training from scratch",
+                        self.Util.WARNING, checkpointPath)
+            state = None
+        if state is not None:
+            self.loadModel(checkpointPath)
+            self.vPrint("Resuming training from epoch %d", self.Util.DEBUG, state['epoch'])
+        data = self.modelInput(self.DATA, self.SPARSE)
+        labels = self.LABELS
+        validationSet = None
+        validationSeed = None
+        if validationSplit:
+            # On resume the validation apps are those of the checkpoint,
+            # so none of the rows it trained on is validated on
+            if state is not None and state.get('validationSeed') is not None:
+                validationSeed = state['validationSeed']
+            elif seed is not None:
+                validationSeed = seed
+            else:
+                validationSeed = int(np.random.randint(2 ** 31 - 1))
+            train, validation = DataSplit.trainTestByKey(self.KEYS, labels, validationSplit,
+                                                         seed=validationSeed)
+            validationSet = (self.inputRows(data, validation), np.asarray(labels[validation]))
+            data = self.inputRows(data, train)
+            labels = labels[train]
+        callback = TrainingMonitor(self, validationSet, monitor=monitor, patience=patience,
+                                   minDelta=minDelta, checkpointPath=checkpointPath,
+                                   checkpointEvery=checkpointEvery, state=state,
+                                   data=fingerprint, validationSplit=validationSplit,
+                                   validationSeed=validationSeed)
+        remaining = nEpoch - callback.epoch
+        if remaining <= 0 or (state is not None and state['stopped']):
+            return callback
+        with self.Util.stage('train', rows=len(data), epochs=remaining) as fields:
+            try:
+                self.MODEL.fit(data,
+                               labels,
+                               n_epoch=remaining,
+                               batch_size=batchSize,
+                               show_metric=showMetric,
+                               validation_set=validationSet,
+                               callbacks=callback
+                               )
+            except StopIteration:
+                pass
+            fields['epoch'] = callback.epoch
+        return callback
 
+    # The scaler is saved next to the model, so scoring uses the same
+    # transform as training
     def saveModel(self, filename='models/model.tflearn'):
         if self.MODEL is None:
             self.createModel()
         self.MODEL.save(filename)
+        if self.SCALER is not None:
+            self.SCALER.save(Scaler.pathForModel(filename))
+        self.exportModel(InferenceModel.pathForModel(filename))
+
+    # Write the weights of the model, its columns, scaler and sparse
+    # feature vocabularies to a .npz
+    # file InferenceModel can score with, without TensorFlow
+    def exportModel(self, filename='models/model.tflearn' + InferenceModel.FILE_SUFFIX):
+        weights = [self.MODEL.get_weights(layer.W) for layer in self.LAYERS]
+        biases = [self.MODEL.get_weights(layer.b) for layer in self.LAYERS]
+        model = InferenceModel(weights, biases, self.ACTIVATIONS, self.schema.columns,
+                               self.SCALER, self.sparse)
+        model.save(filename)
+        return model
 
     def loadModel(self, filename='models/model.tflearn'):
         if self.MODEL is None:
             self.createModel()
         self.MODEL.load(filename)
+        if Scaler.exists(Scaler.pathForModel(filename)):
+            self.SCALER = Scaler.load(Scaler.pathForModel(filename))
+
+    # Return the [malicious, benign] probabilities of each row of an
+    # unscaled feature matrix. Rows are scaled like the training data and
+    # fed to the model batchSize at a time.
+    # sparse are the rows' sparse feature blocks, made dense a batch at
+    # a time.
+    def predict(self, data, batchSize=4096, sparse=None):
+        return self.predictInput(self.modelInput(self.scaleData(data), sparse), batchSize)
+
+    # Return the [malicious, benign] probabilities of a list of app dicts,
+    # as returned by maxSearch or iterApps
+    def scoreApps(self, apps, batchSize=4096):
+        sparse = None
+        if self.sparse is not None:
+            sparse = self.sparse.transform(apps, grow=False)
+        return self.predict(self.schema.buildMatrix(apps), batchSize=batchSize, sparse=sparse)
 
-    def validateModel(self, testSet, testSetLabels):
-        pred = self.MODEL.predict(testSet)
-        fP = 0
-        cM = 0
-        cS = 0
-        iS = 0
-        i = 0
-        for el in pred:
-            if (pred[i][0] > pred[i][1]) and (testSetLabels[i][0] > testSetLabels[i][1]):
-                self.vPrint("Test set #" + str(i+1) +
-                            " correctly identified malicious.",
-                            self.Util.DEBUG)
-                cM = cM + 1
-            elif (pred[i][0] > pred[i][1]) and (testSetLabels[i][0] < testSetLabels[i][1]):
-                self.vPrint("Test set #" + str(i+1) +
-                            " false positively identified malicious.",
-                            self.Util.DEBUG)
-                fP = fP + 1
-            elif (pred[i][0] < pred[i][1]) and (testSetLabels[i][0] < testSetLabels[i][1]):
-                self.vPrint("Test set #" + str(i+1) + " correctly identified safe.",
-                            self.Util.DEBUG)
-                cS = cS + 1
-            elif (pred[i][0] < pred[i][1]) and (testSetLabels[i][0] > testSetLabels[i][1]):
-                self.vPrint("Test set #" + str(i+1) + " incorrectly marked safe.",
-                            self.Util.DEBUG)
-                iS = iS + 1
-            i = i + 1
-        print("Correctly identified malicious: " + str(cM) + "/" + str(cM + iS))
-        print("False positives: " + str(fP) + "/" + str(fP+cS))
+    # Outcome of each validation row, as logged at DEBUG level
+    OUTCOMES = ['correctly identified malicious.',
+                'false positively identified malicious.',
+                'correctly identified safe.',
+                'incorrectly marked safe.']
 
+    # Evaluate the model on a scaled test set, apps with a malicious
+    # probability of at least threshold being flagged. Returns the
+    # tftmetrics.Evaluation with the confusion matrix, rates, ROC-AUC,
+    # PR-AUC and the sweep over thresholds.
+    def validateModel(self, testSet, testSetLabels, threshold=0.5, thresholds=None):
+        with self.Util.stage('validate', rows=len(testSet)):
+            pred = self.predictInput(testSet)
+        result = Metrics.evaluate(pred, testSetLabels, threshold, thresholds)
+        # Per-row messages are only walked when they will be output
+        if self.Util.isEnabled(self.Util.DEBUG):
+            flagged = result.scores >= threshold
+            rowOutcome = np.where(flagged, np.where(result.truth, 0, 1),
+                                  np.where(result.truth, 3, 2))
+            for i, outcome in enumerate(rowOutcome):
+                self.vPrint("Test set #%d %s", self.Util.DEBUG, i + 1, self.OUTCOMES[outcome])
+        if self.Util.isEnabled(0):
+            self.vPrint("%s", 0, result.summary())
+        return result
 
 if __name__ == '__main__':
     print("ERROR: This module should be imported, not run.\
@@ -0,0 +1,181 @@
+# TensorFlow-Tacyt compact app records
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import numpy as np
+from tftschema import FeatureSchema, Projection, NUMERIC_TYPES, STRING_TYPES
+
+
+class AppTable(object):
+    """
+    Apps as a NumPy structured array with a fixed field layout.
+
+    Every app is one record of numeric fields, float32 by default, so a
+    million apps with the appdata categories take tens of MB instead of
+    a dict per app. Missing and non-numeric values are stored as the
+    missing sentinel, like FeatureSchema. The app keys are only kept
+    when a keyField is given, as fixed width UTF-8 bytes: as many bytes
+    per app as the longest key.
+
+    The TFTacyt app helpers (getIntFilteredAppDict, hashAppStrings,
+    setAllValues, normalizeByApp, normalizeByCategory and
+    createTrainingSet) accept an AppTable as well as a list of dicts,
+    and modify and return the table like they do the dicts.
+
+    table[i] is the record of an app, with fields accessed by name,
+    table['field'] the column of a field and table[rows] a new table
+    with the selected rows.
+    """
+
+    DTYPE = np.float32
+    MISSING = FeatureSchema.MISSING
+    CHUNK = 65536
+
+    def __init__(self, records, keys=None, missing=MISSING):
+        self.records = records
+        self.keys = keys
+        self.missing = missing
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer, STRING_TYPES)):
+            return self.records[item]
+        return AppTable(self.records[item],
+                        None if self.keys is None else self.keys[item], self.missing)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    @property
+    def fields(self):
+        return list(self.records.dtype.names)
+
+    @property
+    def nbytes(self):
+        return self.records.nbytes + (0 if self.keys is None else self.keys.nbytes)
+
+    # Structured dtype of the fields
+    @staticmethod
+    def layout(fields, dtype=DTYPE):
+        return [(str(name), dtype) for name in fields]
+
+    # Table of n apps with every value missing
+    @staticmethod
+    def empty(fields, n=0, dtype=DTYPE, missing=MISSING):
+        records = np.empty(n, dtype=AppTable.layout(fields, dtype))
+        for name in fields:
+            records[name] = missing
+        return AppTable(records, missing=missing)
+
+    # Build a table from any iterable of app dicts, such as
+    # TFTacyt.iterApps, without holding the dicts in memory. The fields
+    # default to the sorted numeric fields of the first app.
+    @staticmethod
+    def fromApps(apps, fields=None, keyField=None, dtype=DTYPE, missing=MISSING):
+        apps = iter(apps)
+        first = []
+        if fields is None:
+            for app in apps:
+                first = [app]
+                fields = sorted(name for name in app if type(app[name]) in NUMERIC_TYPES)
+                break
+            else:
+                fields = []
+        projection = Projection(fields, notFound=missing)
+        layout = AppTable.layout(fields, dtype)
+        chunks = []
+        keys = []
+        rows = []
+        for source in (first, apps):
+            for app in source:
+                rows.append(tuple(value if type(value) in NUMERIC_TYPES else missing
+                                  for value in projection.row(app)))
+                if keyField is not None:
+                    keys.append(app.get(keyField, u''))
+                if len(rows) == AppTable.CHUNK:
+                    chunks.append(np.array(rows, dtype=layout))
+                    rows = []
+        chunks.append(np.array(rows, dtype=layout))
+        records = np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+        if keyField is not None:
+            keys = np.array([key.encode('utf-8') if isinstance(key, STRING_TYPES) else b''
+                             for key in keys], dtype=np.bytes_)
+        else:
+            keys = None
+        return AppTable(records, keys, missing)
+
+    # The apps as a list of dicts
+    def toApps(self):
+        fields = self.fields
+        return [dict(zip(fields, record)) for record in self.records.tolist()]
+
+    # Float matrix of the given fields, all of them by default, one row
+    # per app. Fields the table doesn't have are missing.
+    def matrix(self, fields=None, dtype=FeatureSchema.DTYPE):
+        if fields is None:
+            fields = self.fields
+        data = np.empty((len(self), len(fields)), dtype=dtype)
+        for i, name in enumerate(fields):
+            if name in self.records.dtype.names:
+                data[:, i] = self.records[name]
+            else:
+                data[:, i] = self.missing
+        return data
+
+    # Values equal to the missing sentinel
+    def isMissing(self, name):
+        if np.isnan(self.missing):
+            return np.isnan(self.records[name])
+        return self.records[name] == self.missing
+
+    # Set the missing values to setTo, the non-numeric values having
+    # been dropped when the table was built
+    def fillMissing(self, setTo):
+        for name in self.fields:
+            self.records[name][self.isMissing(name)] = setTo
+        return self
+
+    def setAllValues(self, value):
+        for name in self.fields:
+            self.records[name] = value
+        return self
+
+    # Divide every value of an app by the largest value of that app
+    def normalizeByApp(self, nValue=1.0):
+        data = self.matrix(dtype=np.float64)
+        maxValue = data.max(axis=1) if len(self.fields) else np.zeros(len(self))
+        maxValue[maxValue == 0] = 1
+        data = data / maxValue[:, np.newaxis] * nValue
+        for i, name in enumerate(self.fields):
+            self.records[name] = data[:, i]
+        return self
+
+    # Divide every value of a field by the largest value of that field,
+    # or by 1 if it isn't positive
+    def normalizeByCategory(self, nValue=1.0):
+        for name in self.fields:
+            column = self.records[name]
+            maxValue = column.max() if len(column) else 0
+            if maxValue <= 0:
+                maxValue = 1
+            self.records[name] = column / float(maxValue) * nValue
+        return self
@@ -0,0 +1,214 @@
+# TensorFlow-Tacyt evaluation metrics
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import numpy as np
+
+
+class Metrics(object):
+    """
+    Vectorized binary classification metrics, malicious being positive.
+
+    Predictions are [malicious, benign] probability rows, or malicious
+    scores, and labels one-hot [malicious, benign] rows or booleans.
+    An app is predicted malicious when its score is at least the
+    threshold, so ties are counted instead of dropped. Every metric is
+    computed with NumPy over whole arrays, curves from a single sort of
+    the scores.
+    """
+
+    # Malicious score of each row
+    @staticmethod
+    def scores(pred):
+        pred = np.asarray(pred, dtype=np.float64)
+        if pred.ndim == 2:
+            return pred[:, 0]
+        return pred
+
+    # Whether each row is malicious
+    @staticmethod
+    def truth(labels):
+        labels = np.asarray(labels)
+        if labels.ndim == 2:
+            return labels[:, 0] > labels[:, 1]
+        return labels.astype(bool)
+
+    @staticmethod
+    def ratio(a, b):
+        return float(a) / b if b else 0.0
+
+    # Confusion matrix counts of boolean predictions
+    @staticmethod
+    def confusion(truth, predicted):
+        tp = int(np.count_nonzero(predicted & truth))
+        fp = int(np.count_nonzero(predicted & ~truth))
+        fn = int(np.count_nonzero(~predicted & truth))
+        return {'tp': tp, 'fp': fp, 'tn': len(truth) - tp - fp - fn, 'fn': fn}
+
+    # Cumulative true and false positives when flagging the apps from
+    # the highest score down, at each distinct score. Returns
+    # (thresholds, tps, fps), thresholds decreasing.
+    @staticmethod
+    def cumulative(truth, scores):
+        order = np.argsort(-scores, kind='mergesort')
+        scores = scores[order]
+        truth = truth[order]
+        # Last index of every run of equal scores
+        last = np.r_[np.flatnonzero(np.diff(scores)), len(scores) - 1]
+        tps = np.cumsum(truth)[last]
+        fps = (last + 1) - tps
+        return scores[last], tps, fps
+
+    # ROC curve: (falsePositiveRates, truePositiveRates, thresholds),
+    # starting at (0, 0)
+    @staticmethod
+    def rocCurve(truth, scores):
+        if len(scores) == 0:
+            return np.zeros(1), np.zeros(1), np.array([np.inf])
+        thresholds, tps, fps = Metrics.cumulative(truth, scores)
+        nPos = max(tps[-1], 1)
+        nNeg = max(fps[-1], 1)
+        return (np.r_[0, fps / nNeg], np.r_[0, tps / nPos], np.r_[np.inf, thresholds])
+
+    @staticmethod
+    def rocAuc(truth, scores):
+        fpr, tpr, thresholds = Metrics.rocCurve(truth, scores)
+        if not truth.any() or truth.all():
+            return float('nan')
+        return float(np.trapz(tpr, fpr))
+
+    # Precision-recall curve: (precisions, recalls, thresholds)
+    @staticmethod
+    def prCurve(truth, scores):
+        if len(scores) == 0:
+            return np.ones(1), np.zeros(1), np.array([np.inf])
+        thresholds, tps, fps = Metrics.cumulative(truth, scores)
+        precision = tps / (tps + fps)
+        recall = tps / max(tps[-1], 1)
+        return np.r_[1, precision], np.r_[0, recall], np.r_[np.inf, thresholds]
+
+    # Area under the precision-recall curve as average precision, the
+    # precision at each threshold weighted by the recall it adds
+    @staticmethod
+    def prAuc(truth, scores):
+        if not truth.any():
+            return float('nan')
+        precision, recall, thresholds = Metrics.prCurve(truth, scores)
+        return float(np.sum(np.diff(recall) * precision[1:]))
+
+    # Structured array of the confusion counts and rates at each
+    # threshold, flagging apps with a score of at least the threshold
+    @staticmethod
+    def thresholdSweep(truth, scores, thresholds=None):
+        if thresholds is None:
+            thresholds = np.linspace(0, 1, 101)
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        pos = np.sort(scores[truth])
+        neg = np.sort(scores[~truth])
+        sweep = np.zeros(len(thresholds), dtype=[('threshold', np.float64),
+                                                 ('tp', np.int64), ('fp', np.int64),
+                                                 ('tn', np.int64), ('fn', np.int64),
+                                                 ('precision', np.float64),
+                                                 ('recall', np.float64),
+                                                 ('falsePositiveRate', np.float64),
+                                                 ('f1', np.float64)])
+        sweep['threshold'] = thresholds
+        sweep['tp'] = len(pos) - np.searchsorted(pos, thresholds, side='left')
+        sweep['fp'] = len(neg) - np.searchsorted(neg, thresholds, side='left')
+        sweep['fn'] = len(pos) - sweep['tp']
+        sweep['tn'] = len(neg) - sweep['fp']
+        flagged = sweep['tp'] + sweep['fp']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sweep['precision'] = np.where(flagged > 0, sweep['tp'] / np.maximum(flagged, 1), 1.0)
+            sweep['recall'] = sweep['tp'] / max(len(pos), 1)
+            sweep['falsePositiveRate'] = sweep['fp'] / max(len(neg), 1)
+            pr = sweep['precision'] + sweep['recall']
+            sweep['f1'] = np.where(pr > 0, 2 * sweep['precision'] * sweep['recall'] / pr, 0.0)
+        return sweep
+
+    # Evaluate predictions against labels at the given threshold
+    @staticmethod
+    def evaluate(pred, labels, threshold=0.5, thresholds=None):
+        scores = Metrics.scores(pred)
+        truth = Metrics.truth(labels)
+        if len(scores) != len(truth):
+            raise ValueError("Predictions and labels must have the same number of rows")
+        return Evaluation(truth, scores, threshold, thresholds)
+
+
+class Evaluation(object):
+    """
+    Metrics of a set of predictions.
+
+    Attributes:
+        threshold: malicious score from which an app is flagged
+        confusion: dict of tp, fp, tn, fn counts at the threshold
+        accuracy, precision, recall, falsePositiveRate, f1: at the threshold
+        rocAuc, prAuc: threshold independent, nan with a single class
+        sweep: Metrics.thresholdSweep structured array
+    """
+
+    def __init__(self, truth, scores, threshold=0.5, thresholds=None):
+        self.truth = truth
+        self.scores = scores
+        self.threshold = threshold
+        self.confusion = Metrics.confusion(truth, scores >= threshold)
+        tp, fp, tn, fn = [self.confusion[k] for k in ('tp', 'fp', 'tn', 'fn')]
+        self.rows = len(truth)
+        self.accuracy = Metrics.ratio(tp + tn, self.rows)
+        self.precision = Metrics.ratio(tp, tp + fp)
+        self.recall = Metrics.ratio(tp, tp + fn)
+        self.falsePositiveRate = Metrics.ratio(fp, fp + tn)
+        self.f1 = Metrics.ratio(2 * self.precision * self.recall, self.precision + self.recall)
+        self.rocAuc = Metrics.rocAuc(truth, scores)
+        self.prAuc = Metrics.prAuc(truth, scores)
+        self.sweep = Metrics.thresholdSweep(truth, scores, thresholds)
+
+    # Lowest threshold of the sweep, so the highest recall, whose false
+    # positive rate is at most maxFalsePositiveRate
+    def thresholdFor(self, maxFalsePositiveRate):
+        ok = self.sweep[self.sweep['falsePositiveRate'] <= maxFalsePositiveRate]
+        if len(ok) == 0:
+            return None
+        return float(ok['threshold'].min())
+
+    # Metrics as a plain dict, without the per-row arrays
+    def toDict(self):
+        return {'threshold': self.threshold,
+                'rows': self.rows,
+                'confusion': dict(self.confusion),
+                'accuracy': self.accuracy,
+                'precision': self.precision,
+                'recall': self.recall,
+                'falsePositiveRate': self.falsePositiveRate,
+                'f1': self.f1,
+                'rocAuc': self.rocAuc,
+                'prAuc': self.prAuc,
+                'sweep': [dict(zip(self.sweep.dtype.names, [v.item() for v in row]))
+                          for row in self.sweep]}
+
+    def summary(self):
+        c = self.confusion
+        return '\n'.join([
+            "Correctly identified malicious: %d/%d" % (c['tp'], c['tp'] + c['fn']),
+            "False positives: %d/%d" % (c['fp'], c['fp'] + c['tn']),
+            "Threshold %.2f: precision %.3f, recall %.3f, F1 %.3f, accuracy %.3f" % (
+                self.threshold, self.precision, self.recall, self.f1, self.accuracy),
+            "ROC-AUC %.3f, PR-AUC %.3f" % (self.rocAuc, self.prAuc)])
@@ -0,0 +1,145 @@
+# TensorFlow-Tacyt feature scaling
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import os
+import numpy as np
+
+
+class Scaler(object):
+    """
+    Per-column feature scaler.
+
+    fit() computes the column statistics of a data matrix in one pass,
+    transform() applies them to any matrix with the same columns, so
+    apps scored later are scaled exactly like the training data.
+
+    Methods:
+        MAX:    x / max(column max, 0) * nValue, the original
+                normalizeDataByCategory scaling
+        MINMAX: (x - min) / (max - min) * nValue
+        ZSCORE: (x - mean) / std * nValue
+        LOG1P:  log1p(max(x, 0)) scaled like MAX, for heavy tailed
+                counts like numDownloads or size
+    Columns with a zero range are left unscaled.
+    """
+
+    MAX = 'max'
+    MINMAX = 'minmax'
+    ZSCORE = 'zscore'
+    LOG1P = 'log1p'
+    METHODS = [MAX, MINMAX, ZSCORE, LOG1P]
+    FILE_SUFFIX = '.scaler.npz'
+    CHUNK = 65536
+
+    def __init__(self, method=MAX, nValue=100.0):
+        if method not in self.METHODS:
+            raise ValueError("Unknown scaling method: " + str(method))
+        self.method = method
+        self.nValue = nValue
+        self.offset = None
+        self.scale = None
+
+    # Path of the scaler saved alongside the given model file
+    @staticmethod
+    def pathForModel(modelFilename):
+        return modelFilename + Scaler.FILE_SUFFIX
+
+    def _prepare(self, data):
+        data = np.asarray(data, dtype=np.float64)
+        if self.method == self.LOG1P:
+            data = np.log1p(np.maximum(data, 0))
+        return data
+
+    # Compute the column statistics of data, CHUNK rows at a time so a
+    # memory-mapped matrix or a DatasetView is never copied whole
+    def fit(self, data):
+        if len(data) == 0:
+            raise ValueError("Cannot fit a scaler on no rows")
+        count = 0
+        for start in range(0, len(data), self.CHUNK):
+            chunk = self._prepare(data[start:start + self.CHUNK])
+            if count == 0:
+                low = chunk.min(axis=0)
+                high = chunk.max(axis=0)
+                mean = chunk.mean(axis=0)
+                squares = ((chunk - mean) ** 2).sum(axis=0)
+            else:
+                low = np.minimum(low, chunk.min(axis=0))
+                high = np.maximum(high, chunk.max(axis=0))
+                # Merge the chunk's mean and squared deviations with the
+                # running ones (Chan et al.)
+                chunkMean = chunk.mean(axis=0)
+                delta = chunkMean - mean
+                total = count + len(chunk)
+                mean = mean + delta * len(chunk) / total
+                squares = (squares + ((chunk - chunkMean) ** 2).sum(axis=0) +
+                           delta ** 2 * count * len(chunk) / total)
+            count += len(chunk)
+        if self.method == self.MINMAX:
+            offset = low
+            scale = high - low
+        elif self.method == self.ZSCORE:
+            offset = mean
+            scale = np.sqrt(squares / count)
+        else:
+            offset = np.zeros(len(high))
+            scale = np.maximum(high, 0)
+        scale[scale == 0] = 1
+        self.offset = offset
+        self.scale = scale
+        return self
+
+    # Scale data with the fitted statistics, returns a new float32 matrix
+    def transform(self, data):
+        if self.scale is None:
+            raise ValueError("Scaler must be fitted or loaded before transform")
+        data = self._prepare(data)
+        return ((data - self.offset) / self.scale * self.nValue).astype(np.float32)
+
+    def fitTransform(self, data):
+        return self.fit(data).transform(data)
+
+    # Arrays describing the fitted scaler, prefixed to embed them in
+    # another .npz file
+    def toArrays(self, prefix=''):
+        return {prefix + 'method': self.method,
+                prefix + 'nValue': self.nValue,
+                prefix + 'offset': self.offset,
+                prefix + 'scale': self.scale}
+
+    @staticmethod
+    def fromArrays(saved, prefix=''):
+        scaler = Scaler(str(saved[prefix + 'method']), float(saved[prefix + 'nValue']))
+        scaler.offset = saved[prefix + 'offset']
+        scaler.scale = saved[prefix + 'scale']
+        return scaler
+
+    def save(self, filename):
+        np.savez(filename, **self.toArrays())
+
+    @staticmethod
+    def load(filename):
+        with np.load(filename) as saved:
+            return Scaler.fromArrays(saved)
+
+    @staticmethod
+    def exists(filename):
+        return os.path.isfile(filename)
@@ -0,0 +1,137 @@
+# TensorFlow-Tacyt feature schema
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import numpy as np
+from tftutils import TFTUtils
+
+try:
+    STRING_TYPES = basestring
+    NUMERIC_TYPES = (int, long, float)
+except NameError:
+    STRING_TYPES = str
+    NUMERIC_TYPES = (int, float)
+
+
+class Projection(object):
+    """
+    Compiled projection of app dicts onto a list of fields.
+
+    The fields are compiled once into a set and a column index, so each
+    app is projected with a single pass over the fields instead of a
+    scan of the categories for every key of the document. The API
+    response is left untouched, new dicts or rows are returned.
+    Missing fields are set to notFound, or left out if it is None.
+    Without fields, apps are copied whole.
+    """
+
+    def __init__(self, fields, notFound=None):
+        self.fields = list(fields)
+        self.fieldSet = frozenset(self.fields)
+        self.index = dict((name, i) for i, name in enumerate(self.fields))
+        self.notFound = notFound
+
+    def __len__(self):
+        return len(self.fields)
+
+    # New dict with only the projected fields of the app
+    def project(self, app):
+        if not self.fields:
+            return dict(app)
+        if self.notFound is None:
+            return dict((name, app[name]) for name in self.fields if name in app)
+        notFound = self.notFound
+        return dict((name, app.get(name, notFound)) for name in self.fields)
+
+    def projectAll(self, apps):
+        return [self.project(app) for app in apps]
+
+    # Values of the projected fields of the app, in field order
+    def row(self, app):
+        notFound = self.notFound
+        return [app.get(name, notFound) for name in self.fields]
+
+
+class FeatureSchema(object):
+    """
+    Fixed column layout of the feature matrix.
+
+    The categories are compiled once into a column index, sorted by
+    name so matrices line up with the ones createTrainingSet builds.
+    Missing and non-numeric values are written as the missing sentinel.
+    """
+
+    MISSING = -1.0
+    DTYPE = np.float32
+    MALICIOUS = [1., 0.]
+    BENIGN = [0., 1.]
+
+    def __init__(self, categories, missing=MISSING):
+        self.columns = sorted(categories)
+        self.index = dict((name, i) for i, name in enumerate(self.columns))
+        self.missing = missing
+
+    def __len__(self):
+        return len(self.columns)
+
+    # Create the schema from an appdata categories file
+    @staticmethod
+    def fromFile(fileName):
+        return FeatureSchema(TFTUtils.getCategoriesFromFile(fileName))
+
+    # Empty matrix with the schema's columns, to append rows to
+    def emptyMatrix(self):
+        return np.empty((0, len(self.columns)), dtype=self.DTYPE)
+
+    # Return the values of a single app dict in column order
+    def rowFromApp(self, app):
+        missing = self.missing
+        row = []
+        for name in self.columns:
+            value = app.get(name, missing)
+            if type(value) not in NUMERIC_TYPES:
+                value = missing
+            row.append(value)
+        return row
+
+    # Write a list of app dicts into a preallocated float32 matrix,
+    # one row per app
+    def buildMatrix(self, apps):
+        data = np.empty((len(apps), len(self.columns)), dtype=self.DTYPE)
+        for i, app in enumerate(apps):
+            data[i] = self.rowFromApp(app)
+        return data
+
+    # Array of the identifying field of each app, empty if missing
+    @staticmethod
+    def buildKeys(apps, field='key'):
+        keys = [app.get(field, u'') for app in apps]
+        return np.array([key if isinstance(key, STRING_TYPES) else u'' for key in keys],
+                        dtype=np.unicode_)
+
+    # Labels for n apps of the same class, [malicious, benign]
+    @staticmethod
+    def buildLabels(n, malicious=False):
+        labels = np.empty((n, 2), dtype=FeatureSchema.DTYPE)
+        if malicious:
+            labels[:] = FeatureSchema.MALICIOUS
+        else:
+            labels[:] = FeatureSchema.BENIGN
+        return labels
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# TensorFlow-Tacyt batch scoring
+#
+# Scores apps fetched from Tacyt with a trained model, streaming the
+# malicious probability of each app as JSON lines or CSV.
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import argparse
+import csv
+import json
+import sys
+from itertools import islice
+from multiprocessing.pool import ThreadPool
+from tft import TFTacyt
+from tftutils import TFTUtils
+from tftinference import InferenceModel
+
+
+class Scorer(object):
+    """
+    Streams apps through a trained TFTacyt model in large batches.
+
+    Apps come from search queries or app keys, features are built with
+    the instance's schema and scaled with the scaler saved alongside
+    the model, and the results are written as soon as each batch is
+    predicted. With an InferenceModel, batches are scored in NumPy
+    instead of the tflearn model.
+    """
+
+    FORMATS = ['jsonl', 'csv']
+    CSV_HEADER = ['key', 'malicious', 'benign', 'prediction']
+
+    def __init__(self, tft, batchSize=4096, threshold=0.5, workers=8, model=None):
+        self.tft = tft
+        self.model = tft if model is None else model
+        self.batchSize = batchSize
+        self.threshold = threshold
+        self.workers = workers
+
+    # Iterate over the apps found by each query, keeping only the
+    # model's categories and the app key
+    def appsFromQueries(self, queries):
+        fields = self.tft.searchFields()
+        for query in queries:
+            for app in self.tft.iterApps(query, fields=fields):
+                yield app
+
+    # Fetch a single app by key, None if it can't be retrieved
+    def fetchApp(self, key):
+        response = self.tft.api.get_app_details(key)
+        if response is None or response.get_error():
+            self.tft.vPrint("Details for %s failed: %s", self.tft.Util.ERROR,
+                            key, response and response.get_error())
+            return None
+        app = response.get_data().get('result', response.get_data())
+        if 'applications' in app:
+            if not app['applications']:
+                return None
+            app = app['applications'][0]
+        app.setdefault(self.tft.KEY_FIELD, key)
+        return app
+
+    # Iterate over the apps with the given keys, fetched concurrently
+    # and yielded in order
+    def appsFromKeys(self, keys):
+        pool = ThreadPool(self.workers)
+        try:
+            for app in pool.imap(self.fetchApp, keys, chunksize=1):
+                if app is not None:
+                    yield app
+        finally:
+            pool.close()
+            pool.join()
+
+    # Yield (key, [malicious, benign]) for every app, predicting
+    # batchSize apps at a time
+    def score(self, apps):
+        apps = iter(apps)
+        while True:
+            batch = list(islice(apps, self.batchSize))
+            if not batch:
+                return
+            pred = self.model.scoreApps(batch, batchSize=self.batchSize)
+            for app, probabilities in zip(batch, pred):
+                yield app.get(self.tft.KEY_FIELD, ''), probabilities
+
+    # Write the scores to the output file in the given format,
+    # returns the number of apps scored
+    def write(self, scores, output, format='jsonl'):
+        count = 0
+        if format == 'csv':
+            writer = csv.writer(output)
+            writer.writerow(self.CSV_HEADER)
+        for key, probabilities in scores:
+            malicious = float(probabilities[0])
+            benign = float(probabilities[1])
+            prediction = 'malicious' if malicious >= self.threshold else 'benign'
+            if format == 'csv':
+                writer.writerow([key, malicious, benign, prediction])
+            else:
+                output.write(json.dumps({'key': key,
+                                         'malicious': malicious,
+                                         'benign': benign,
+                                         'prediction': prediction}) + '\n')
+            count = count + 1
+        output.flush()
+        return count
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Score Tacyt apps with a trained TensorFlow-Tacyt model.')
+    parser.add_argument('-q', '--query', action='append', default=[],
+                        help='Tacyt search query whose results are scored, may be repeated')
+    parser.add_argument('-k', '--key', action='append', default=[],
+                        help='Tacyt app key to score, may be repeated')
+    parser.add_argument('--queries-file',
+                        help='file with one search query per line')
+    parser.add_argument('--keys-file',
+                        help='file with one app key per line')
+    parser.add_argument('-m', '--model', default='models/model.tflearn',
+                        help='trained model file, with its scaler alongside. '
+                        'Its exported weights are used instead when present.')
+    parser.add_argument('--appdata', default='appdata',
+                        help='categories file the model was trained with')
+    parser.add_argument('--api-keys', default='keys.api',
+                        help='Tacyt API keys file')
+    parser.add_argument('-f', '--format', choices=Scorer.FORMATS, default='jsonl')
+    parser.add_argument('-o', '--output', help='output file, stdout by default')
+    parser.add_argument('-b', '--batch-size', type=int, default=4096)
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help='concurrent app detail requests for --key')
+    parser.add_argument('-t', '--threshold', type=float, default=0.5,
+                        help='malicious probability from which an app is flagged')
+    args = parser.parse_args(argv)
+    if not (args.query or args.key or args.queries_file or args.keys_file):
+        parser.error('give at least one query or app key to score')
+    return args
+
+
+def readLines(fileName):
+    with open(fileName) as f:
+        return [line.rstrip('\r\n') for line in f if line.strip()]
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+
+    queries = list(args.query)
+    if args.queries_file:
+        queries.extend(readLines(args.queries_file))
+    keys = list(args.key)
+    if args.keys_file:
+        keys.extend(readLines(args.keys_file))
+
+    api = TFTUtils.readAPI(args.api_keys)
+    model = None
+    sparse = None
+    if InferenceModel.exists(InferenceModel.pathForModel(args.model)):
+        model = InferenceModel.load(InferenceModel.pathForModel(args.model))
+        categories = model.columns
+        sparse = model.sparse
+    else:
+        categories = TFTUtils.getCategoriesFromFile(args.appdata)
+    tft = TFTacyt(api, categories, verbosity=TFTUtils.ERROR, sparseFeatures=sparse)
+    if model is None:
+        tft.loadModel(args.model)
+    scorer = Scorer(tft, batchSize=args.batch_size, threshold=args.threshold,
+                    workers=args.workers, model=model)
+
+    def apps():
+        for app in scorer.appsFromQueries(queries):
+            yield app
+        for app in scorer.appsFromKeys(keys):
+            yield app
+
+    output = sys.stdout if args.output is None else open(args.output, 'w')
+    try:
+        scorer.write(scorer.score(apps()), output, format=args.format)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
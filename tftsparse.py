@@ -0,0 +1,371 @@
+# TensorFlow-Tacyt sparse features
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import json
+import re
+import zlib
+import numpy as np
+from tftschema import STRING_TYPES
+from tftstore import DatasetView
+
+DTYPE = np.float32
+
+
+# scipy is only needed once sparse features are used, so it's
+# imported on demand
+def sparseModule():
+    try:
+        import scipy.sparse
+    except ImportError:
+        raise ImportError("Sparse features need scipy, install it with: pip install scipy")
+    return scipy.sparse
+
+
+# Values of a list or string field of an app, [] if missing
+def fieldValues(app, field):
+    value = app.get(field)
+    if isinstance(value, STRING_TYPES):
+        return [value]
+    if isinstance(value, (list, tuple)):
+        return [v for v in value if isinstance(v, STRING_TYPES)]
+    return []
+
+
+class MultiHotEncoder(object):
+    """
+    Multi-hot columns of a list field such as permissionName.
+
+    Every distinct value gets a column of the vocabulary, in the order
+    they are first seen, and an app has a 1 in the column of each value
+    it lists. The vocabulary grows while the dataset is built, up to
+    maxSize columns, and is frozen once the model is created, see
+    SparseFeatures.freeze: unknown values are then ignored.
+    """
+
+    KIND = 'multihot'
+
+    def __init__(self, field, maxSize=None):
+        self.field = field
+        self.maxSize = maxSize
+        self.values = []
+        self.counts = []
+        self.vocabulary = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def fields(self):
+        return [self.field]
+
+    @property
+    def columns(self):
+        return [self.field + '=' + value for value in self.values]
+
+    # CSR matrix with one row per app. With grow, new values are added
+    # to the vocabulary and counted.
+    def transform(self, apps, grow=True):
+        vocabulary = self.vocabulary
+        indices = []
+        indptr = [0]
+        for app in apps:
+            row = set()
+            for value in fieldValues(app, self.field):
+                column = vocabulary.get(value)
+                if column is None and grow and (self.maxSize is None or
+                                                len(self.values) < self.maxSize):
+                    column = len(self.values)
+                    vocabulary[value] = column
+                    self.values.append(value)
+                    self.counts.append(0)
+                if column is not None:
+                    row.add(column)
+            if grow:
+                for column in row:
+                    self.counts[column] += 1
+            indices.extend(sorted(row))
+            indptr.append(len(indices))
+        return sparseModule().csr_matrix((np.ones(len(indices), dtype=DTYPE),
+                                          np.array(indices, dtype=np.int32),
+                                          np.array(indptr, dtype=np.int32)),
+                                         shape=(len(apps), len(self.values)))
+
+    # Drop the values seen in fewer than minCount apps. Returns the
+    # indices of the kept columns, to select them in existing matrices.
+    def prune(self, minCount):
+        keep = np.array([i for i, count in enumerate(self.counts) if count >= minCount],
+                        dtype=np.int64)
+        self.values = [self.values[i] for i in keep]
+        self.counts = [self.counts[i] for i in keep]
+        self.vocabulary = dict((value, i) for i, value in enumerate(self.values))
+        return keep
+
+    def toState(self):
+        return {'kind': self.KIND, 'field': self.field, 'maxSize': self.maxSize,
+                'values': self.values, 'counts': self.counts}
+
+    @staticmethod
+    def fromState(state):
+        encoder = MultiHotEncoder(state['field'], state['maxSize'])
+        encoder.values = list(state['values'])
+        encoder.counts = list(state['counts'])
+        encoder.vocabulary = dict((value, i) for i, value in enumerate(encoder.values))
+        return encoder
+
+
+class HashingEncoder(object):
+    """
+    Hashed columns of string fields such as developerName,
+    certificateIssuerCommonName or the words of description.
+
+    Each value, prefixed with its field, is hashed with crc32 into one of
+    a fixed number of buckets, so the width is bounded and no vocabulary
+    is kept. Fields in textFields are split into lowercase word tokens
+    first. A bucket holds 1 if any value of the app falls in it, or the
+    number of values with binary=False.
+    """
+
+    KIND = 'hashing'
+    TOKEN = re.compile(r'\w+', re.UNICODE)
+
+    def __init__(self, fields, buckets=1024, textFields=(), binary=True):
+        self.fieldNames = list(fields)
+        self.buckets = buckets
+        self.textFields = list(textFields)
+        self.binary = binary
+
+    def __len__(self):
+        return self.buckets
+
+    @property
+    def fields(self):
+        return self.fieldNames
+
+    # Named after the hashed fields, like developerName+description#17,
+    # so the columns of several encoders stay distinct
+    @property
+    def columns(self):
+        prefix = '+'.join(self.fieldNames)
+        return ['%s#%d' % (prefix, i) for i in range(self.buckets)]
+
+    # Bucket of a value of a field
+    def bucket(self, field, value):
+        return (zlib.crc32((field + '=' + value).encode('utf-8')) & 0xffffffff) % self.buckets
+
+    def tokens(self, app, field):
+        values = fieldValues(app, field)
+        if field in self.textFields:
+            return [token for value in values for token in self.TOKEN.findall(value.lower())]
+        return values
+
+    # CSR matrix with one row per app. Buckets are computed once per
+    # distinct value of the batch.
+    def transform(self, apps, grow=True):
+        cache = {}
+        indices = []
+        indptr = [0]
+        for app in apps:
+            row = []
+            for field in self.fieldNames:
+                for value in self.tokens(app, field):
+                    column = cache.get((field, value))
+                    if column is None:
+                        column = cache[(field, value)] = self.bucket(field, value)
+                    row.append(column)
+            if self.binary:
+                row = sorted(set(row))
+            indices.extend(row)
+            indptr.append(len(indices))
+        matrix = sparseModule().csr_matrix((np.ones(len(indices), dtype=DTYPE),
+                                            np.array(indices, dtype=np.int32),
+                                            np.array(indptr, dtype=np.int32)),
+                                           shape=(len(apps), self.buckets))
+        matrix.sum_duplicates()
+        return matrix
+
+    # Buckets can't be dropped without moving the others, keep them all
+    def prune(self, minCount):
+        return np.arange(self.buckets)
+
+    def toState(self):
+        return {'kind': self.KIND, 'fields': self.fieldNames, 'buckets': self.buckets,
+                'textFields': self.textFields, 'binary': self.binary}
+
+    @staticmethod
+    def fromState(state):
+        return HashingEncoder(state['fields'], state['buckets'], state['textFields'],
+                              state['binary'])
+
+
+class ModelInput(object):
+    """
+    Model input rows: the dense matrix followed by the columns of the
+    sparse blocks, which are only made dense for the rows taken.
+
+    tflearn takes batches from it by row indices like from an array, so
+    training and evaluation never hold the sparse columns of the whole
+    dataset as a dense matrix, only those of one batch.
+    """
+
+    def __init__(self, data, blocks, features):
+        self.data = data
+        self.blocks = blocks
+        self.features = features
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def shape(self):
+        return (len(self.data), self.data.shape[1] + self.features.width)
+
+    # Dense rows, rows being an index, index list or array, or slice
+    def __getitem__(self, rows):
+        if isinstance(rows, (int, np.integer)):
+            return self[[rows]][0]
+        return np.hstack((np.asarray(self.data[rows], dtype=DTYPE),
+                          self.features.toDense(self.features.take(self.blocks, rows))))
+
+    # The given rows, still with sparse blocks
+    def take(self, rows):
+        data = self.data.take(rows) if isinstance(self.data, DatasetView) else self.data[rows]
+        return ModelInput(data, self.features.take(self.blocks, rows), self.features)
+
+
+class SparseFeatures(object):
+    """
+    Sparse feature blocks of a dataset, alongside the dense FeatureSchema
+    matrix.
+
+    Each encoder produces one CSR block, so a dataset's sparse features
+    are a list of blocks with one row per app. Only the values of the
+    encoded fields are kept from the apps until they are transformed.
+    The blocks are made dense one batch at a time when fed to the model.
+    Once frozen, when the model is created, transforming never grows the
+    vocabularies, so the input width stays that of the model.
+    """
+
+    ENCODERS = {MultiHotEncoder.KIND: MultiHotEncoder,
+                HashingEncoder.KIND: HashingEncoder}
+
+    def __init__(self, encoders):
+        self.encoders = list(encoders)
+        self.frozen = False
+
+    @property
+    def fields(self):
+        fields = []
+        for encoder in self.encoders:
+            fields.extend(f for f in encoder.fields if f not in fields)
+        return fields
+
+    @property
+    def width(self):
+        return sum(len(encoder) for encoder in self.encoders)
+
+    @property
+    def columns(self):
+        return [column for encoder in self.encoders for column in encoder.columns]
+
+    # The encoded fields of each app, to transform later
+    def extract(self, apps):
+        fields = self.fields
+        return [dict((f, app[f]) for f in fields if f in app) for app in apps]
+
+    # Stop the vocabularies from growing, the model's input width
+    # depending on them
+    def freeze(self):
+        self.frozen = True
+
+    # One CSR block per encoder. Vocabularies only grow with grow and
+    # while not frozen.
+    def transform(self, apps, grow=True):
+        grow = grow and not self.frozen
+        return [encoder.transform(apps, grow) for encoder in self.encoders]
+
+    def empty(self, rows=0):
+        return self.transform([{}] * rows, grow=False)
+
+    # Widen a block to the current vocabulary size of its encoder
+    @staticmethod
+    def pad(block, width):
+        if block.shape[1] == width:
+            return block
+        return sparseModule().csr_matrix((block.data, block.indices, block.indptr),
+                                         shape=(block.shape[0], width))
+
+    # Rows of every block, rows being an index array or slice
+    @staticmethod
+    def take(blocks, rows):
+        return [block[rows] for block in blocks]
+
+    # Stack lists of blocks row-wise
+    def concat(self, blocksList):
+        sparse = sparseModule()
+        return [sparse.vstack([self.pad(blocks[i], len(encoder)) for blocks in blocksList],
+                              format='csr')
+                for i, encoder in enumerate(self.encoders)]
+
+    # Replace the given rows of the blocks with the rows of newBlocks
+    def setRows(self, blocks, rows, newBlocks):
+        result = []
+        for i, encoder in enumerate(self.encoders):
+            block = self.pad(blocks[i], len(encoder)).tolil()
+            block[rows] = self.pad(newBlocks[i], len(encoder)).tolil()
+            result.append(block.tocsr())
+        return result
+
+    # Keep only the values seen in at least minCount apps, returns the
+    # pruned blocks
+    def prune(self, blocks, minCount):
+        if self.frozen:
+            raise ValueError("Sparse features are frozen, prune them before creating the model")
+        result = []
+        for i, encoder in enumerate(self.encoders):
+            block = self.pad(blocks[i], len(encoder))
+            result.append(block[:, encoder.prune(minCount)].tocsr())
+        return result
+
+    # Dense float32 matrix of the blocks side by side, as the model input
+    def toDense(self, blocks):
+        rows = blocks[0].shape[0] if blocks else 0
+        dense = np.zeros((rows, self.width), dtype=DTYPE)
+        start = 0
+        for block, encoder in zip(blocks, self.encoders):
+            dense[:, start:start + block.shape[1]] = block.toarray()
+            start = start + len(encoder)
+        return dense
+
+    def toState(self):
+        return [encoder.toState() for encoder in self.encoders]
+
+    @staticmethod
+    def fromState(state):
+        return SparseFeatures([SparseFeatures.ENCODERS[s['kind']].fromState(s) for s in state])
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.toState(), f)
+
+    @staticmethod
+    def load(filename):
+        with open(filename) as f:
+            return SparseFeatures.fromState(json.load(f))
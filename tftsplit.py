@@ -0,0 +1,122 @@
+# TensorFlow-Tacyt dataset splitting
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import numpy as np
+
+
+class DataSplit(object):
+    """
+    Train/test splits as index arrays.
+
+    Every split is computed from permutations of the row indices in a
+    single pass, so holding out rows costs O(n) regardless of the test
+    size. Splits can be stratified by label so each class keeps its
+    share of the dataset in both sides, and are reproducible with a seed.
+    """
+
+    # Class of each row, from one-hot [malicious, benign] labels or
+    # from a vector of class ids
+    @staticmethod
+    def labelClasses(labels):
+        labels = np.asarray(labels)
+        if labels.ndim == 2:
+            return np.argmax(labels, axis=1)
+        return labels
+
+    # Number of test rows for a fraction (float) or count (int) of n rows
+    @staticmethod
+    def testCount(n, testSize):
+        if isinstance(testSize, float):
+            return int(round(n * testSize))
+        return min(int(testSize), n)
+
+    # Split the test count between classes proportionally to their size,
+    # handing out the rounding remainder to the largest fractions
+    @staticmethod
+    def allocate(classSizes, nTest):
+        total = classSizes.sum()
+        if total == 0:
+            return np.zeros(len(classSizes), dtype=int)
+        exact = classSizes * (nTest / total)
+        counts = np.floor(exact).astype(int)
+        remainder = nTest - counts.sum()
+        if remainder > 0:
+            counts[np.argsort(counts - exact)[:remainder]] += 1
+        return counts
+
+    # Return (trainIndices, testIndices) for the given labels
+    @staticmethod
+    def trainTest(labels, testSize=0.1, stratify=True, seed=None, rng=None):
+        if rng is None:
+            rng = np.random.RandomState(seed)
+        classes = DataSplit.labelClasses(labels)
+        n = len(classes)
+        nTest = DataSplit.testCount(n, testSize)
+        if not stratify:
+            order = rng.permutation(n)
+            return np.sort(order[nTest:]), np.sort(order[:nTest])
+
+        order = np.argsort(classes, kind='mergesort')
+        values, starts, sizes = np.unique(classes[order], return_index=True, return_counts=True)
+        counts = DataSplit.allocate(sizes, nTest)
+        train = []
+        test = []
+        for start, size, count in zip(starts, sizes, counts):
+            members = order[start:start + size][rng.permutation(size)]
+            test.append(members[:count])
+            train.append(members[count:])
+        return (np.sort(np.concatenate(train)) if train else np.empty(0, dtype=int),
+                np.sort(np.concatenate(test)) if test else np.empty(0, dtype=int))
+
+    # trainTest of the rows in the order of their app keys, so a seed
+    # splits the same apps the same way whatever the order of the rows
+    @staticmethod
+    def trainTestByKey(keys, labels, testSize=0.1, stratify=True, seed=None):
+        order = np.argsort(np.asarray(keys), kind='mergesort')
+        train, test = DataSplit.trainTest(np.asarray(labels)[order], testSize, stratify, seed)
+        return np.sort(order[train]), np.sort(order[test])
+
+    # Generate nSplits independent (trainIndices, testIndices) splits
+    @staticmethod
+    def shuffleSplits(labels, nSplits=5, testSize=0.1, stratify=True, seed=None):
+        rng = np.random.RandomState(seed)
+        for i in range(nSplits):
+            yield DataSplit.trainTest(labels, testSize, stratify, rng=rng)
+
+    # Return k (trainIndices, testIndices) folds, every row appearing in
+    # exactly one test fold
+    @staticmethod
+    def kFold(labels, k=5, stratify=True, seed=None):
+        rng = np.random.RandomState(seed)
+        classes = DataSplit.labelClasses(labels)
+        n = len(classes)
+        fold = np.empty(n, dtype=int)
+        if stratify:
+            # Deal each class round-robin over the folds
+            offset = 0
+            for value in np.unique(classes):
+                members = np.flatnonzero(classes == value)
+                members = members[rng.permutation(len(members))]
+                fold[members] = (np.arange(len(members)) + offset) % k
+                offset = offset + len(members)
+        else:
+            fold[rng.permutation(n)] = np.arange(n) % k
+        return [(np.flatnonzero(fold != i), np.flatnonzero(fold == i)) for i in range(k)]
@@ -0,0 +1,270 @@
+# TensorFlow-Tacyt columnar dataset store
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import os
+import json
+import time
+import numpy as np
+
+
+class DatasetStore(object):
+    """
+    Columnar on-disk dataset.
+
+    A dataset is a directory holding the float32 feature matrix, the
+    label matrix and the per-row app keys as .npy files, plus the column
+    schema as JSON. Arrays are loaded memory-mapped, so opening a
+    dataset takes the same time and memory whatever its size and only
+    the rows actually read are paged in. Sparse feature blocks, if any,
+    are stored as the arrays of their CSR matrices next to the
+    vocabularies of their SparseFeatures.
+    """
+
+    FEATURES = 'features.npy'
+    LABELS = 'labels.npy'
+    KEYS = 'keys.npy'
+    SCHEMA = 'schema.json'
+    INDEX = 'index.json'
+    SPARSE = 'sparse.json'
+    SPARSE_ARRAYS = ['data', 'indices', 'indptr']
+    VERSION = 1
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def exists(self):
+        return os.path.isfile(self.path(self.SCHEMA))
+
+    # Save the DatasetIndex of the dataset alongside it
+    def saveIndex(self, index):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        index.save(self.path(self.INDEX))
+
+    # Return the saved DatasetIndex, or None if the dataset has none
+    def loadIndex(self):
+        if not os.path.isfile(self.path(self.INDEX)):
+            return None
+        return DatasetIndex.load(self.path(self.INDEX))
+
+    # Write an array to a temporary file renamed over the target, so
+    # arrays still memory-mapped from the previous file stay valid. This
+    # is what allows saving a dataset loaded from the same directory.
+    def saveArray(self, name, array):
+        path = self.path(name)
+        temporary = path[:-len('.npy')] + '.tmp.npy'
+        np.save(temporary, array)
+        os.rename(temporary, path)
+
+    # Write the dataset, replacing any previous one in the directory.
+    # The schema is written last so a partial save is never loaded.
+    def save(self, data, labels, keys, columns):
+        if len(data) != len(labels) or len(data) != len(keys):
+            raise ValueError("Data, labels and keys must have the same number of rows")
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        for name in (self.SCHEMA, self.SPARSE):
+            if os.path.exists(self.path(name)):
+                os.remove(self.path(name))
+        self.saveArray(self.FEATURES, np.asarray(data, dtype=np.float32))
+        self.saveArray(self.LABELS, np.asarray(labels, dtype=np.float32))
+        self.saveArray(self.KEYS, np.asarray(keys, dtype=np.unicode_))
+        with open(self.path(self.SCHEMA), 'w') as f:
+            json.dump({'version': self.VERSION,
+                       'columns': list(columns),
+                       'rows': len(data)}, f)
+
+    def sparseName(self, block, array):
+        return 'sparse%d.%s.npy' % (block, array)
+
+    def sparsePath(self, block, array):
+        return self.path(self.sparseName(block, array))
+
+    # Save the sparse feature blocks of the dataset and the SparseFeatures
+    # they were built with. Call after save, which removes them.
+    def saveSparse(self, blocks, features):
+        for i, block in enumerate(features.concat([blocks])):
+            for array in self.SPARSE_ARRAYS:
+                self.saveArray(self.sparseName(i, array), getattr(block, array))
+        features.save(self.path(self.SPARSE))
+
+    # Return (blocks, features), or (None, None) if the dataset has no
+    # sparse features
+    def loadSparse(self, mmap=True):
+        if not os.path.isfile(self.path(self.SPARSE)):
+            return None, None
+        from tftsparse import SparseFeatures, sparseModule
+        features = SparseFeatures.load(self.path(self.SPARSE))
+        mode = 'r' if mmap else None
+        blocks = []
+        for i, encoder in enumerate(features.encoders):
+            arrays = [np.load(self.sparsePath(i, array), mmap_mode=mode)
+                      for array in self.SPARSE_ARRAYS]
+            blocks.append(sparseModule().csr_matrix(tuple(arrays),
+                                                    shape=(len(arrays[2]) - 1, len(encoder))))
+        return blocks, features
+
+    def loadSchema(self):
+        with open(self.path(self.SCHEMA)) as f:
+            return json.load(f)
+
+    # Return (data, labels, keys, columns). With mmap the arrays are
+    # read-only views on the files.
+    def load(self, mmap=True):
+        mode = 'r' if mmap else None
+        schema = self.loadSchema()
+        data = np.load(self.path(self.FEATURES), mmap_mode=mode)
+        labels = np.load(self.path(self.LABELS), mmap_mode=mode)
+        keys = np.load(self.path(self.KEYS), mmap_mode=mode)
+        return data, labels, keys, schema['columns']
+
+    # Yield (data, labels) batches read straight from the mapped files.
+    # With shuffle, batches are taken from a permutation of the rows.
+    def iterBatches(self, batchSize=1024, shuffle=False, seed=None):
+        data, labels, keys, columns = self.load(mmap=True)
+        n = len(data)
+        if shuffle:
+            order = np.random.RandomState(seed).permutation(n)
+            for start in range(0, n, batchSize):
+                rows = np.sort(order[start:start + batchSize])
+                yield np.asarray(data[rows]), np.asarray(labels[rows])
+        else:
+            for start in range(0, n, batchSize):
+                yield (np.asarray(data[start:start + batchSize]),
+                       np.asarray(labels[start:start + batchSize]))
+
+
+class DatasetView(object):
+    """
+    Rows of a data matrix, such as a memory-mapped dataset, in a given
+    order and optionally transformed, read one batch at a time.
+
+    tflearn takes batches from it by row indices like from an array, so
+    a dataset can be shuffled, scaled and trained on without copying
+    the matrix: only the rows of one batch are read and transformed.
+    The rows of a batch are read in file order.
+    """
+
+    BATCH_SIZE = 4096
+
+    def __init__(self, data, order=None, transform=None):
+        self.data = data
+        self.order = np.arange(len(data)) if order is None else np.asarray(order)
+        self.transform = transform
+
+    def __len__(self):
+        return len(self.order)
+
+    @property
+    def shape(self):
+        return (len(self.order),) + tuple(self.data.shape[1:])
+
+    # Rows, rows being an index, index list or array, or slice
+    def __getitem__(self, rows):
+        if isinstance(rows, (int, np.integer)):
+            return self[[rows]][0]
+        index = self.order[rows]
+        inFileOrder = np.argsort(index, kind='mergesort')
+        batch = np.empty((len(index),) + tuple(self.data.shape[1:]), dtype=self.data.dtype)
+        batch[inFileOrder] = self.data[index[inFileOrder]]
+        if self.transform is not None:
+            batch = self.transform(batch)
+        return batch
+
+    def __iter__(self):
+        for start in range(0, len(self), self.BATCH_SIZE):
+            for row in self[start:start + self.BATCH_SIZE]:
+                yield row
+
+    # Every row in memory, for numpy functions given the view
+    def __array__(self, dtype=None):
+        batch = self[:]
+        return batch if dtype is None else batch.astype(dtype)
+
+    # The given rows, still unread
+    def take(self, rows):
+        return DatasetView(self.data, self.order[rows], self.transform)
+
+
+class DatasetIndex(object):
+    """
+    Persisted index of the apps in a dataset and the terms synced into it.
+
+    Apps are identified by their Tacyt key. The index records the term
+    each app was first found with and when every term was last synced,
+    so refreshing a dataset only fetches terms that are new or stale.
+    It is saved as JSON next to the dataset arrays.
+    """
+
+    def __init__(self):
+        self.apps = {}
+        self.terms = {}
+
+    def __contains__(self, key):
+        return key in self.apps
+
+    def __len__(self):
+        return len(self.apps)
+
+    # Index the apps of an existing dataset, e.g. one saved without index
+    @staticmethod
+    def fromKeys(keys, term=None):
+        index = DatasetIndex()
+        for key in keys:
+            index.addApp(key, term)
+        return index
+
+    # Record an app, keeping the term it was first seen with
+    def addApp(self, key, term=None):
+        if key and key not in self.apps:
+            self.apps[key] = term
+
+    # Whether the term was synced, and less than maxAge seconds ago if given
+    def isSynced(self, term, maxAge=None, now=None):
+        entry = self.terms.get(term)
+        if entry is None:
+            return False
+        if maxAge is None:
+            return True
+        if now is None:
+            now = time.time()
+        return now - entry['synced'] < maxAge
+
+    def markSynced(self, term, malicious, apps, now=None):
+        if now is None:
+            now = time.time()
+        self.terms[term] = {'synced': now, 'malicious': bool(malicious), 'apps': apps}
+
+    def save(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'apps': self.apps, 'terms': self.terms}, f)
+
+    @staticmethod
+    def load(filename):
+        index = DatasetIndex()
+        with open(filename) as f:
+            saved = json.load(f)
+        index.apps = saved['apps']
+        index.terms = saved['terms']
+        return index
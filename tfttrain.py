@@ -0,0 +1,177 @@
+# TensorFlow-Tacyt training monitor
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+#
+# This module imports tflearn, only import it from the model methods.
+
+from __future__ import print_function
+from __future__ import division
+import hashlib
+import json
+import os
+import numpy as np
+import tflearn
+from tftmetrics import Metrics
+from tftutils import TFTUtils
+
+
+class TrainingMonitor(tflearn.callbacks.Callback):
+    """
+    tflearn callback for TFTacyt.trainModel.
+
+    After every epoch it evaluates the monitored metric, checkpoints the
+    model every checkpointEvery epochs and stops the training once the
+    metric hasn't improved by more than minDelta for patience epochs.
+
+    Monitors:
+        LOSS:           validation loss, or training loss without a
+                        validation set. Lower is better.
+        DETECTION_RATE: share of the malicious validation apps detected,
+                        flagged like validateModel does. Higher is better.
+
+    A checkpoint is the model saved with TFTacyt.saveModel plus a JSON
+    state file with the epoch, the early stopping counters, the
+    fingerprint of the training data and the validation split and its
+    seed, so training resumes where it left off, on the same data and
+    validation apps only.
+    """
+
+    LOSS = 'loss'
+    DETECTION_RATE = 'detectionRate'
+    MONITORS = [LOSS, DETECTION_RATE]
+    STATE_SUFFIX = '.state.json'
+
+    def __init__(self, tft, validationSet=None, monitor=LOSS, patience=None, minDelta=0.0,
+                 checkpointPath=None, checkpointEvery=10, state=None, data=None,
+                 validationSplit=None, validationSeed=None):
+        if monitor not in self.MONITORS:
+            raise ValueError("Unknown monitor: " + str(monitor))
+        if monitor == self.DETECTION_RATE and validationSet is None:
+            raise ValueError("Monitoring the detection rate needs a validation set")
+        self.tft = tft
+        self.validationSet = validationSet
+        self.monitor = monitor
+        self.patience = patience
+        self.minDelta = minDelta
+        self.checkpointPath = checkpointPath
+        self.checkpointEvery = checkpointEvery
+        self.data = data
+        self.validationSplit = validationSplit
+        self.validationSeed = validationSeed
+        self.epoch = 0
+        self.best = None
+        self.bestEpoch = 0
+        self.wait = 0
+        self.stopped = False
+        if state is not None:
+            self.epoch = state['epoch']
+            self.best = state['best']
+            self.bestEpoch = state['bestEpoch']
+            self.wait = state['wait']
+
+    # Identifies a dataset by its columns, labels, app keys and the
+    # parameters of its Scaler, whatever the order of its rows. The
+    # scaler stands for the feature values: rescaled data or changed
+    # values give other column statistics.
+    @staticmethod
+    def fingerprint(columns, labels, keys, scaler=None):
+        labels = np.asarray(labels)
+        digest = hashlib.md5(json.dumps(list(columns)).encode('utf-8'))
+        digest.update(np.array([np.count_nonzero(labels[:, 0] > labels[:, 1])]).tobytes())
+        digest.update(u'\n'.join(np.sort(np.asarray(keys))).encode('utf-8'))
+        if scaler is not None:
+            # Rounded so the same statistics always hash the same
+            digest.update(json.dumps([scaler.method, '%.6g' % scaler.nValue] +
+                                     ['%.6g' % v for v in scaler.offset] +
+                                     ['%.6g' % v for v in scaler.scale]).encode('utf-8'))
+        return {'rows': len(labels), 'hash': digest.hexdigest()}
+
+    # Path of the state file saved with the checkpoint
+    @staticmethod
+    def statePath(checkpointPath):
+        return checkpointPath + TrainingMonitor.STATE_SUFFIX
+
+    # Return the state of the last checkpoint, None if there is none
+    @staticmethod
+    def loadState(checkpointPath):
+        if checkpointPath is None or not os.path.isfile(TrainingMonitor.statePath(checkpointPath)):
+            return None
+        with open(TrainingMonitor.statePath(checkpointPath)) as f:
+            return json.load(f)
+
+    def state(self):
+        return {'epoch': self.epoch,
+                'monitor': self.monitor,
+                'best': self.best,
+                'bestEpoch': self.bestEpoch,
+                'wait': self.wait,
+                'stopped': self.stopped,
+                'data': self.data,
+                'validationSplit': self.validationSplit,
+                'validationSeed': self.validationSeed}
+
+    # Current value of the monitored metric
+    def value(self, trainingState):
+        if self.monitor == self.DETECTION_RATE:
+            data, labels = self.validationSet
+            return Metrics.evaluate(self.tft.predictInput(data), labels).recall
+        loss = getattr(trainingState, 'val_loss', None)
+        if loss is None:
+            loss = getattr(trainingState, 'global_loss', None)
+        return None if loss is None else float(loss)
+
+    def improved(self, value):
+        if self.best is None:
+            return True
+        if self.monitor == self.LOSS:
+            return value < self.best - self.minDelta
+        return value > self.best + self.minDelta
+
+    def checkpoint(self):
+        directory = os.path.dirname(self.checkpointPath)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.tft.saveModel(self.checkpointPath)
+        with open(self.statePath(self.checkpointPath), 'w') as f:
+            json.dump(self.state(), f)
+
+    def on_epoch_end(self, training_state):
+        self.epoch = self.epoch + 1
+        value = self.value(training_state)
+        if value is not None:
+            if self.improved(value):
+                self.best = value
+                self.bestEpoch = self.epoch
+                self.wait = 0
+            else:
+                self.wait = self.wait + 1
+        self.tft.vPrint("Epoch %d %s %s, best %s at epoch %d", TFTUtils.DEBUG,
+                        self.epoch, self.monitor, value, self.best, self.bestEpoch)
+        if self.patience is not None and self.wait >= self.patience:
+            self.stopped = True
+            self.tft.vPrint("Early stopping at epoch %d, no improvement since epoch %d",
+                            TFTUtils.WARNING, self.epoch, self.bestEpoch)
+        if self.checkpointPath is not None and (
+                self.stopped or self.epoch % self.checkpointEvery == 0):
+            self.checkpoint()
+        if self.stopped:
+            raise StopIteration
+
+    def on_train_end(self, training_state):
+        if self.checkpointPath is not None and not self.stopped:
+            self.checkpoint()
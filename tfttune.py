@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# TensorFlow-Tacyt cross-validation and hyperparameter search
+#
+# Copyright (C) 2017 Rafael Ortiz <rafael@ortizmail.cc>
+#
+# This library is free software; you can redistribute it and/or
+# modify it under the terms of the GNU Lesser General Public
+# License as published by the Free Software Foundation; either
+# version 2.1 of the License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301
+# USA
+
+from __future__ import print_function
+from __future__ import division
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+from tft import TFTacyt
+from tftmetrics import Metrics
+from tftscaler import Scaler
+from tftsplit import DataSplit
+from tftstore import DatasetStore, DatasetView
+from tftutils import TFTUtils
+
+
+try:
+    INTEGER_TYPES = (int, long)
+except NameError:
+    INTEGER_TYPES = (int,)
+
+# Number of TensorFlow threads of the current worker process, set by
+# initWorker
+WORKER_THREADS = 1
+
+
+# Pin the TensorFlow thread count of a worker process. Runs before
+# TensorFlow is imported in the worker. Worker functions are module
+# level so the pool can pickle them.
+def initWorker(threads):
+    global WORKER_THREADS
+    WORKER_THREADS = threads
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+
+
+# Train and evaluate one configuration on one fold, in a fresh graph.
+# Returns the fold's metrics.
+def runFold(task):
+    import tensorflow as tf
+    import tflearn
+    index, params, fold, train, test, dataset, seed, verbosity = task
+    start = time.time()
+    store = DatasetStore(dataset)
+    data, labels, keys, columns = store.load(mmap=True)
+    blocks, features = store.loadSparse(mmap=True)
+    tft = TFTacyt(None, columns, verbosity=verbosity, sparseFeatures=features)
+    tft.DATA = DatasetView(data, train)
+    tft.LABELS = np.asarray(labels[train])
+    tft.KEYS = np.asarray(keys[train])
+    testSparse = None
+    if features is not None:
+        tft.SPARSE = features.take(blocks, train)
+        testSparse = features.take(blocks, test)
+    with tf.Graph().as_default():
+        tflearn.init_graph(seed=seed, num_cores=WORKER_THREADS)
+        tft.preprocess(method=params.get('scaling', Scaler.MAX))
+        tft.createModel(hiddenLayers=params.get('hiddenLayers'),
+                        learningRate=params.get('learningRate'),
+                        activation=params.get('activation'))
+        tft.trainModel(nEpoch=params.get('nEpoch'), batchSize=params.get('batchSize'),
+                       showMetric=False)
+        pred = tft.predict(np.asarray(data[test]), sparse=testSparse)
+    result = Tuner.foldMetrics(pred, np.asarray(labels[test]))
+    result.update({'config': index, 'fold': fold, 'seconds': time.time() - start})
+    return result
+
+
+class Tuner(object):
+    """
+    k-fold cross-validation of model hyperparameters on a saved dataset.
+
+    Every (configuration, fold) pair is trained in a pool of worker
+    processes, each building its model in its own TensorFlow graph with
+    a pinned number of threads, so the folds of many configurations run
+    side by side on all cores. Workers read the dataset memory-mapped
+    from its DatasetStore directory instead of receiving a copy.
+
+    A configuration is a dict of:
+        hiddenLayers: list of hidden layer sizes
+        learningRate: Adam learning rate
+        activation:   activation of the hidden layers
+        nEpoch:       training epochs
+        batchSize:    training batch size
+        scaling:      Scaler method fitted on the training folds
+    Missing keys take the TFTacyt defaults.
+    """
+
+    METRICS = ['accuracy', 'detectionRate', 'falsePositiveRate', 'rocAuc', 'prAuc']
+
+    def __init__(self, dataset, folds=5, processes=None, threads=1, seed=None,
+                 stratify=True, verbosity=TFTUtils.ERROR):
+        self.dataset = dataset
+        self.folds = folds
+        self.threads = threads
+        if processes is None:
+            processes = max(1, multiprocessing.cpu_count() // threads)
+        self.processes = processes
+        self.seed = seed
+        self.stratify = stratify
+        self.verbosity = verbosity
+        self.Util = TFTUtils(verbosity)
+
+    # Every combination of the values listed for each parameter
+    @staticmethod
+    def paramGrid(grid):
+        names = sorted(grid)
+        return [dict(zip(names, values))
+                for values in itertools.product(*[grid[name] for name in names])]
+
+    # n configurations drawn from the space. Lists are sampled uniformly,
+    # (low, high) tuples uniformly between the bounds, or log-uniformly
+    # for learningRate. Integer bounds, e.g. for nEpoch or batchSize,
+    # give integers between them, both included.
+    @staticmethod
+    def randomParams(space, n, seed=None):
+        rng = np.random.RandomState(seed)
+        configs = []
+        for i in range(n):
+            config = {}
+            for name in sorted(space):
+                values = space[name]
+                if isinstance(values, tuple):
+                    low, high = values
+                    if name == 'learningRate':
+                        config[name] = float(np.exp(rng.uniform(np.log(low), np.log(high))))
+                    elif isinstance(low, INTEGER_TYPES) and isinstance(high, INTEGER_TYPES):
+                        config[name] = int(rng.randint(low, high + 1))
+                    else:
+                        config[name] = float(rng.uniform(low, high))
+                else:
+                    config[name] = values[rng.randint(len(values))]
+            configs.append(config)
+        return configs
+
+    # Metrics of [malicious, benign] predictions against one-hot labels
+    @staticmethod
+    def foldMetrics(pred, labels):
+        result = Metrics.evaluate(pred, labels)
+        return {'accuracy': result.accuracy,
+                'detectionRate': result.recall,
+                'falsePositiveRate': result.falsePositiveRate,
+                'rocAuc': result.rocAuc,
+                'prAuc': result.prAuc}
+
+    # Cross-validate every configuration, returns the ranked report
+    def run(self, configs, rankBy='accuracy'):
+        labels = DatasetStore(self.dataset).load(mmap=True)[1]
+        splits = DataSplit.kFold(labels, self.folds, stratify=self.stratify, seed=self.seed)
+        tasks = [(index, params, fold, train, test, self.dataset, self.seed, self.verbosity)
+                 for index, params in enumerate(configs)
+                 for fold, (train, test) in enumerate(splits)]
+        self.Util.vPrint("Training %d configurations x %d folds on %d processes",
+                         self.Util.DEBUG, len(configs), self.folds, self.processes)
+        with self.Util.stage('tune', configs=len(configs), folds=self.folds,
+                             processes=self.processes):
+            pool = multiprocessing.Pool(self.processes, initializer=initWorker,
+                                        initargs=(self.threads,))
+            try:
+                results = []
+                for result in pool.imap_unordered(runFold, tasks):
+                    self.Util.vPrint("Config %d fold %d: %s", self.Util.DEBUG,
+                                     result['config'], result['fold'], result)
+                    results.append(result)
+            finally:
+                pool.close()
+                pool.join()
+        return Tuner.rank(configs, results, rankBy)
+
+    # Mean and standard deviation of each metric across the folds of
+    # each configuration, best mean of rankBy first. Lower is better
+    # for falsePositiveRate.
+    @staticmethod
+    def rank(configs, results, rankBy='accuracy'):
+        report = []
+        for index, params in enumerate(configs):
+            folds = [r for r in results if r['config'] == index]
+            entry = {'params': params, 'folds': len(folds)}
+            for metric in Tuner.METRICS:
+                values = np.array([r[metric] for r in folds])
+                entry[metric] = float(values.mean()) if len(values) else float('nan')
+                entry[metric + 'Std'] = float(values.std()) if len(values) else float('nan')
+            report.append(entry)
+        sign = 1 if rankBy == 'falsePositiveRate' else -1
+        report.sort(key=lambda entry: sign * entry[rankBy])
+        return report
+
+    # Report as a text table, one configuration per line
+    @staticmethod
+    def formatReport(report):
+        lines = ["%4s  %-17s %-17s %-17s %-17s  %s" % ('rank', 'accuracy', 'detection rate',
+                                                      'false positives', 'ROC-AUC', 'params')]
+        for rank, entry in enumerate(report):
+            lines.append("%4d  %.3f +/- %.3f   %.3f +/- %.3f   %.3f +/- %.3f   %.3f +/- %.3f    %s" % (
+                rank + 1,
+                entry['accuracy'], entry['accuracyStd'],
+                entry['detectionRate'], entry['detectionRateStd'],
+                entry['falsePositiveRate'], entry['falsePositiveRateStd'],
+                entry['rocAuc'], entry['rocAucStd'],
+                json.dumps(entry['params'], sort_keys=True)))
+        return '\n'.join(lines)
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Cross-validate TensorFlow-Tacyt hyperparameters on a saved dataset.')
+    parser.add_argument('-d', '--dataset', default='datasets/dataset',
+                        help='dataset directory written by TFTacyt.saveDataset')
+    parser.add_argument('-g', '--grid', default='{}',
+                        help='JSON object of parameter name to list of values, e.g. '
+                        '\'{"hiddenLayers": [[32, 32], [64]], "learningRate": [0.001, 0.0001]}\'. '
+                        'With --random, {"low": x, "high": y} objects are sampled as ranges.')
+    parser.add_argument('-r', '--random', type=int, default=0,
+                        help='sample this many random configurations instead of the full grid')
+    parser.add_argument('-k', '--folds', type=int, default=5)
+    parser.add_argument('-p', '--processes', type=int, default=None,
+                        help='worker processes, all cores divided by --threads by default')
+    parser.add_argument('-t', '--threads', type=int, default=1,
+                        help='TensorFlow threads per worker')
+    parser.add_argument('--rank-by', choices=Tuner.METRICS, default='accuracy')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-o', '--output', help='also write the report as JSON to this file')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+    grid = json.loads(args.grid)
+    if args.random:
+        space = dict((name, (values['low'], values['high']) if isinstance(values, dict) else values)
+                     for name, values in grid.items())
+        configs = Tuner.randomParams(space, args.random, seed=args.seed)
+    else:
+        configs = Tuner.paramGrid(grid)
+    tuner = Tuner(args.dataset, folds=args.folds, processes=args.processes,
+                  threads=args.threads, seed=args.seed)
+    report = tuner.run(configs, rankBy=args.rank_by)
+    print(Tuner.formatReport(report))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
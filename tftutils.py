@@ -1,11 +1,21 @@
 from __future__ import print_function
+import logging
+import sys
+import time
+from contextlib import contextmanager
 from tacyt import TacytApp
+from tacyt.authorization.Auth import Auth
+from tacyt.authorization.KeyPool import KeyPool
 
 
 class TFTUtils(object):
     """
     Utilities for the TensorFlow-Tacyt system.
 
+    Messages go through the "tft" logger. They are %-formatted with
+    their arguments only when the verbosity level lets them through,
+    so disabled messages cost a single comparison.
+
     Attributes:
         VERBOSITY: verbosity level (0-3), default 0
                    set to max verbosity if verbosity entered
@@ -18,25 +28,88 @@ class TFTUtils(object):
     WARNING = 2
     DEBUG = 3
     levels = ['SILENT', 'ERROR', 'WARNING', 'DEBUG']
+    # logging level of the messages of each verbosity level
+    LOG_LEVELS = {SILENT: logging.CRITICAL + 10,
+                  0: logging.INFO,
+                  ERROR: logging.ERROR,
+                  WARNING: logging.WARNING,
+                  DEBUG: logging.DEBUG}
+    LOGGER = 'tft'
+    LOG_FORMAT = '%(levelname)s: %(message)s'
 
     def __init__(self, verbosity=SILENT):
         if verbosity <= self.DEBUG and verbosity >= self.SILENT:
             self.VERBOSITY = verbosity
         else:
             self.VERBOSITY = self.DEBUG
-        print("Verbosity level set to: ", self.VERBOSITY)
+        self.logger = TFTUtils.getLogger()
+        self.vPrint("Verbosity level set to: %d", self.DEBUG, self.VERBOSITY)
+
+    # Return the "tft" logger, writing to stdout unless the application
+    # configured handlers for it
+    @staticmethod
+    def getLogger():
+        logger = logging.getLogger(TFTUtils.LOGGER)
+        if not logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter(TFTUtils.LOG_FORMAT))
+            logger.addHandler(handler)
+            logger.setLevel(logging.DEBUG)
+            logger.propagate = False
+        return logger
+
+    # Whether messages of the given verbosity level are output, to skip
+    # work done only to build them
+    def isEnabled(self, verbosity):
+        return verbosity <= self.VERBOSITY
 
-    def vPrint(self, message, verbosity=0):
+    # Log message % args if the verbosity level allows it. Pass values
+    # as args rather than formatting them into the message.
+    def vPrint(self, message, verbosity=0, *args):
         if verbosity <= self.VERBOSITY:
-            print(self.levels[verbosity] + ": " + str(message))
+            self.logger.log(self.LOG_LEVELS[verbosity], message, *args)
+
+    # Time the enclosed block and log its duration, with any extra
+    # fields, as one "stage" line. The fields dict is yielded so the
+    # block can add results to it:
+    #     with util.stage('search', term=term) as fields:
+    #         fields['apps'] = len(apps)
+    @contextmanager
+    def stage(self, name, verbosity=DEBUG, **fields):
+        start = time.time()
+        try:
+            yield fields
+        finally:
+            if verbosity <= self.VERBOSITY:
+                elapsed = time.time() - start
+                fields['seconds'] = round(elapsed, 6)
+                self.logger.log(self.LOG_LEVELS[verbosity], 'stage=%s %s', name,
+                                ' '.join('%s=%s' % item for item in sorted(fields.items())),
+                                extra={'stage': name, 'fields': fields})
+
+    # Read every API_ID/SECRET pair from the keys file, in order.
+    # Blank lines between pairs are ignored.
+    @staticmethod
+    def readAPIKeys(apifile='keys.api'):
+        with open(apifile) as keys:
+            lines = [line.rstrip('\r\n') for line in keys if line.strip()]
+        pairs = []
+        for i in range(0, len(lines) - 1, 2):
+            pairs.append((lines[i][7:], lines[i+1][7:]))
+        return pairs
 
+    # Create the API from the keys file. If it holds several keys,
+    # requests are spread across all of them with the given strategy
+    # (KeyPool.ROUND_ROBIN or KeyPool.QUOTA).
     @staticmethod
-    def readAPI(apifile='keys.api'):
-        keys = open(apifile)
-        API_ID = keys.readline().rstrip('\n')[7:]
-        SECRET = keys.readline().rstrip('\n')[7:]
-        keys.close()
-        api = TacytApp.TacytApp(API_ID, SECRET)
+    def readAPI(apifile='keys.api', strategy=KeyPool.ROUND_ROBIN):
+        pairs = TFTUtils.readAPIKeys(apifile)
+        API_ID, SECRET = pairs[0]
+        keyPool = None
+        if len(pairs) > 1:
+            keyPool = KeyPool([Auth(appId, secret) for appId, secret in pairs],
+                              strategy=strategy)
+        api = TacytApp.TacytApp(API_ID, SECRET, key_pool=keyPool)
         return api
 
     @staticmethod